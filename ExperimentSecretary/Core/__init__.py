@@ -1 +1,5 @@
-from .expSession import *
\ No newline at end of file
+from .expSession import *
+from .sessionCatalog import *
+from .sidecar import *
+from .metricLog import *
+from .sweep import *
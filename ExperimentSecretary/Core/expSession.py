@@ -1,68 +1,145 @@
 """
     An experiment session is one entry in the logging database
 """
-from bson import json_util
 import json
 from datetime import datetime
 import time
-import git
-from git import Repo
 import os
 import traceback
 import platform
 
 import sys
-import io
-import types
+import threading
+import hashlib
+import gzip
+import collections
+
+from .sessionCatalog import SessionCatalog
+from .sidecar import writeSidecars
+from .metricLog import metricLogger
 
 
 class Session_t:
     # column functions are called after each experiment(with no extra arguments)
     # its name and return value will be recorded 
     _columnFuncs = {}
-    def  __init__(self,expName, basedir):
+    _columnCache = {} # class -> its (cheap, expensive) column functions, reset when a column is registered
+    # the seconds an expensive column may take before it is recorded as an error
+    _columnTimeout = 30
+    # arrays (or lists of numbers) with at least this many elements are saved as `.npy` files next to the record
+    _sidecarMinSize = 1000
+    def  __init__(self,expName, basedir, recordName = None):
         self._basedir = basedir
         self._runtimeInfoStor = {} # The information added in runtime, added through `add_info`
-        self._storFileName = datetime.now().strftime("%Y-%m-%d-%H_%M_%S")
+        self._storFileName = recordName if (recordName is not None) else datetime.now().strftime("%Y-%m-%d-%H_%M_%S")
+        self._metrics = None # created by the first `log_metric`
         if(expName is not None):
             self._runtimeInfoStor["expName"] = expName
         
     class _decoraGen:
         def __get__(self, obj, objtype):
             class Decorator:
-                def __init__(self,f):
+                def __init__(self,f = None, expensive = False, timeout = None):
+                    self.expensive = expensive
+                    self.timeout = timeout
+                    if(f is not None):
+                        self(f)
+
+                def __call__(self,f):
+                    """
+                    called with the function when the decorator is used with arguments: @SOMECLASS.column(expensive = True)
+                    """
                     self.f = f
+                    f._columnExpensive = self.expensive
+                    f._columnTimeout = self.timeout
                     lst = objtype._columnFuncs.get(objtype,[])
                     lst.append(self.f)
                     objtype._columnFuncs[objtype] = lst
+                    objtype._columnCache.clear()
                     setattr(objtype,f.__name__,f)
+                    return self
 
                 def __get__(self, obj, objtype):
                     return self.f
             return Decorator
 
     # calling @SOMECLASS.column will regist the decorated function to the column list
+    # calling @SOMECLASS.column(expensive = True, timeout = 10) makes it run in a thread, in parallel with the other expensive ones
     column = _decoraGen() 
 
+    @classmethod
+    def _columnsOf(cls):
+        """
+        the column functions of the class (from all its bases), resolved once per class
+        """
+        try:
+            return cls._columnCache[cls]
+        except KeyError:
+            funcs = [f for k in cls._columnFuncs.keys() if issubclass(cls,k) for f in cls._columnFuncs[k]]
+            cls._columnCache[cls] = funcs
+            return funcs
+
     def _Getcolumns(self):
-        return {f.__name__:f(self)
-            for k in self._columnFuncs.keys() if isinstance(self,k) for f in self._columnFuncs[k]}
+        """
+        call all the column functions. The failed or timed out ones are recorded in `column_errors` instead of their values
+        """
+        funcs = self._columnsOf()
+        values, errors, threads = {}, {}, {}
+        start = time.time()
+        for f in funcs:
+            if(getattr(f,"_columnExpensive",False)):
+                # a daemon thread each, so that a timed out column does not keep the interpreter from exiting
+                res = {}
+                def run(f = f, res = res):
+                    try:
+                        res["value"] = f(self)
+                    except Exception as ex:
+                        res["error"] = repr(ex)
+                threads[f] = (threading.Thread(target = run, daemon = True), res)
+                threads[f][0].start()
+        for f in funcs:
+            if(f in threads):
+                continue
+            try:
+                values[f] = f(self)
+            except Exception as ex:
+                errors[f.__name__] = repr(ex)
+        for f,(thread,res) in threads.items():
+            timeout = f._columnTimeout if (f._columnTimeout is not None) else self._columnTimeout
+            thread.join(max(0, start + timeout - time.time()))
+            if(thread.is_alive()):
+                errors[f.__name__] = "timed out after {} s".format(timeout)
+            elif("error" in res):
+                errors[f.__name__] = res["error"]
+            else:
+                values[f] = res["value"]
+        cols = {f.__name__: values.get(f) for f in funcs}
+        if(len(errors)):
+            cols["column_errors"] = errors
+        return cols
             
     def body(self):
         raise NotImplementedError
 
     def _summarise(self):
         # record the experiment
+        if(self._metrics is not None):
+            self._metrics.close()
+            self._runtimeInfoStor["metrics"] = {"file": os.path.basename(self._metrics.filename), "counts": self._metrics.counts}
         cols = self._Getcolumns()
         cols.update(self._runtimeInfoStor)
 
         # json.dumps(anObject, default=json_util.default)
         # json.loads(aJsonString, object_hook=json_util.object_hook)
         
-        os.makedirs(os.path.join(self._basedir,".exps"),exist_ok=True)
+        expdir = os.path.join(self._basedir,".exps")
+        os.makedirs(expdir,exist_ok=True)
+        cols = writeSidecars(cols, expdir, self._storFileName, self._sidecarMinSize)
         # print(json.dumps(cols,default=json_util.default))
-        with open(os.path.join(self._basedir,".exps", self._storFileName+".json"),"w") as f:
+        with open(os.path.join(expdir, self._storFileName+".json"),"w") as f:
+            from bson import json_util
             json.dump(cols,f, indent = 2, default=json_util.default)
+        SessionCatalog(self._basedir).add(self._storFileName+".json", cols)
     
 
     def __call__(self):
@@ -84,6 +161,15 @@ class Session_t:
         """
         self._runtimeInfoStor[k] = v
 
+    def log_metric(self,name,value,step = None):
+        """
+            append a sample to the time series `name`, the step counts up from 0 if not given
+            the samples are written to `.exps/<record>.metrics.bin` in the background, read them with `readMetrics`
+        """
+        if(self._metrics is None):
+            self._metrics = metricLogger(os.path.join(self._basedir,".exps",self._storFileName+".metrics.bin"))
+        self._metrics.log(name,value,step)
+
     def __enter__(self):
         return self
 
@@ -96,54 +182,184 @@ class Session_t:
 class stdLogger:
     """
         Log all the `write` and `writeLines` into a string stream
-        modify the stdobj in construction, and change it back in destruction
+        modify the stdobj in construction, and change it back in `close` (or destruction)
+        memLimit: the number of characters kept in memory. Beyond it, the whole log goes to the gzip file `spillFile`
+            (only the first and last `excerpt` characters are kept in memory), or is dropped if `spillFile` is None
     """
-    def __init__(self, stdobj):
+    def __init__(self, stdobj, memLimit = 1<<20, spillFile = None, excerpt = 1<<14, bufsize = 1<<16):
         self.stdobj = stdobj
         self.sys_write = stdobj.write
         self.sys_writelines = stdobj.writelines
-
-        self.output = io.StringIO()
-
-        def logf_write(self_, text):
-            self.output.write(text)
-            self.sys_write(text)
-            
-
-        def logf_writelines(self_, text):
-            self.output.writelines(text)
-            self.sys_writelines(text)
-            
-        stdobj.write = types.MethodType(logf_write, stdobj )
-        stdobj.writelines = types.MethodType(logf_writelines, stdobj )
+        self.memLimit = memLimit
+        self.spillFile = spillFile
+        self.excerpt = excerpt
+        self.bufsize = bufsize
+
+        self.chunks = [] # the whole log while it is within `memLimit`, afterwards the pending writes to the spill file
+        self.size = 0
+        self.pendingSize = 0
+        self.spilled = False
+        self._spill = None
+        self.head = ""
+        self.tail = collections.deque()
+        self.tailSize = 0
+
+        stdobj.write = self.write
+        stdobj.writelines = self.writelines
+
+    def write(self, text):
+        self._record(text)
+        return self.sys_write(text)
+
+    def writelines(self, lines):
+        lines = list(lines)
+        for l in lines:
+            self._record(l)
+        return self.sys_writelines(lines)
+
+    def _record(self, text):
+        self.size += len(text)
+        self.chunks.append(text)
+        if(not self.spilled):
+            if(self.size > self.memLimit):
+                self._startSpill()
+            return
+        self.pendingSize += len(text)
+        self.tail.append(text)
+        self.tailSize += len(text)
+        while(self.tailSize - len(self.tail[0]) >= self.excerpt):
+            self.tailSize -= len(self.tail.popleft())
+        if(self.pendingSize >= self.bufsize):
+            self._flush()
+
+    def _startSpill(self):
+        text = "".join(self.chunks)
+        self.spilled = True
+        self.head = text[:self.excerpt]
+        self.tail = collections.deque([text[-self.excerpt:]])
+        self.tailSize = len(self.tail[0])
+        if(self.spillFile is not None):
+            os.makedirs(os.path.dirname(os.path.abspath(self.spillFile)), exist_ok = True)
+            self._spill = gzip.open(self.spillFile, "wt")
+        self.chunks = [text]
+        self.pendingSize = len(text)
+        self._flush()
+
+    def _flush(self):
+        if(self._spill is not None):
+            self._spill.write("".join(self.chunks))
+        self.chunks = []
+        self.pendingSize = 0
+
+    def close(self):
+        """
+        put back the original `write` and `writelines`, and close the spill file
+        """
+        if(self.stdobj.write == self.write):
+            self.stdobj.write = self.sys_write
+            self.stdobj.writelines = self.sys_writelines
+        if(self.spilled):
+            self._flush()
+        if(self._spill is not None):
+            self._spill.close()
+            self._spill = None
 
     def __del__(self):
-        self.stdobj.write = types.MethodType(self.sys_write, self.stdobj )
-        self.stdobj.writelines = types.MethodType(self.sys_writelines, self.stdobj )
+        self.close()
 
     def getvalue(self):
-        return self.output.getvalue()
+        """
+        the whole log, read back from the spill file if it was spilled
+        """
+        if(not self.spilled):
+            return "".join(self.chunks)
+        if(self.spillFile is None):
+            return self.head + "".join(self.tail)
+        if(self._spill is not None):
+            self._flush()
+            self._spill.flush()
+        with gzip.open(self.spillFile, "rt") as f:
+            return f.read()
+
+    def summary(self):
+        """
+        the whole log if it is within `memLimit`, otherwise its head and tail with a pointer to the spill file
+        """
+        if(not self.spilled):
+            return "".join(self.chunks)
+        return {"head": self.head, "tail": "".join(self.tail)[-self.excerpt:], "chars": self.size,
+            "log": None if (self.spillFile is None) else os.path.basename(self.spillFile)}
+
+def collectGitState(basedir, gitPolicy = "full", gitDiffLimit = 1<<20):
+    """
+        the git state recorded by `Session`: head commit, diff (see `gitPolicy` of `Session`), dirty and untracked files
+        errors are returned as {"error": ...}
+    """
+    try:
+        from git import Repo # GitPython is slow to import, only load it when the state is collected
+        repo = Repo(os.path.abspath(basedir),search_parent_directories=True)
+        t = repo.head.commit.tree
+        state = {"version": repo.head.commit.hexsha}
+        diff = repo.git.diff(t)
+        if(gitPolicy == "hash"):
+            state["diff"] = "sha1:" + hashlib.sha1(diff.encode()).hexdigest()
+        elif(len(diff) > gitDiffLimit):
+            state["diff"] = diff[:gitDiffLimit] + "\n[truncated, {} characters in total]".format(len(diff))
+        else:
+            state["diff"] = diff
+        state["dirty"] = repo.git.diff(t, name_only = True).splitlines()
+        untracked = repo.git.ls_files(others = True, exclude_standard = True).splitlines()
+        state["untracked"] = {"count": len(untracked), "files": untracked[:20]}
+    except Exception as ex:
+        state = {"error": repr(ex)}
+    return state
+
 
 class Session(Session_t):
     """
     The most basic fields an experiment
     """
 
-    def __init__(self,expName=None, basedir = '.', terminalLog = False, **kwargs):
+    def __init__(self,expName=None, basedir = '.', terminalLog = False, terminalLogLimit = 1<<20,
+            gitPolicy = "full", gitDiffLimit = 1<<20, gitTimeout = 30, gitState = None, recordName = None, **kwargs):
         """
         The init value will save all the kwargs, so that user can pass whatever he want to stor to the init of parent class
+        The git state is collected in a background thread, so that the experiment can start right away
+            gitPolicy: "full": record the diff, cut at `gitDiffLimit` characters
+                       "hash": record only the sha1 of the diff, for huge repos
+                       "skip": do not look at git at all
+            gitTimeout: seconds to wait for the git thread when the session is summarised
+            gitState: an already collected state (see `collectGitState`), then git is not looked at again
+        terminalLogLimit: the characters of stdout/stderr kept in memory, longer logs are written to
+            `.exps/<record>.stdout.gz` and the record keeps their head and tail
+        recordName: the name of the record file in `.exps`, the init time by default
         """
-        super().__init__(expName, basedir)
+        super().__init__(expName, basedir, recordName)
+        self.params = kwargs
         self.add_info("Session Parameters",kwargs)
         
-        self._git_version_ = self._git_version()
         self._init_time_ = datetime.now()
-        self._git_diff_ = self._git_diff()
+        self.gitPolicy = gitPolicy
+        self.gitDiffLimit = gitDiffLimit
+        self.gitTimeout = gitTimeout
+        self._git_state_ = gitState if (gitState is not None) else {}
+        self._git_thread = None
+        if(gitPolicy != "skip" and gitState is None):
+            self._git_holder = {} # owned by the thread, a late result after a timeout stays in it
+            self._git_thread = threading.Thread(target = self._collect_git, args = (self._git_holder,), daemon = True)
+            self._git_thread.start()
 
         self.terminalLog = terminalLog
         if(self.terminalLog):
-            self.stdoutLog = stdLogger(sys.stdout)
-            self.stderrLog = stdLogger(sys.stderr)
+            spill = os.path.join(self._basedir,".exps",self._storFileName)
+            self.stdoutLog = stdLogger(sys.stdout, terminalLogLimit, spill + ".stdout.gz")
+            self.stderrLog = stdLogger(sys.stderr, terminalLogLimit, spill + ".stderr.gz")
+
+    def _summarise(self):
+        super()._summarise()
+        if(self.terminalLog):
+            self.stdoutLog.close()
+            self.stderrLog.close()
 
     def body(self):
         """
@@ -159,10 +375,21 @@ class Session(Session_t):
     def init_time(self):
         return self._init_time_
 
-    def _git_version(self):
-        repo = Repo(os.path.abspath(self._basedir),search_parent_directories=True)
-        headcommit = repo.head.commit
-        return headcommit.hexsha
+    def _collect_git(self, holder):
+        """
+            run in the background thread, puts the state in `holder`, which `_git` reads once the thread is done
+        """
+        holder["state"] = collectGitState(self._basedir, self.gitPolicy, self.gitDiffLimit)
+
+    def _git(self, key):
+        if(self._git_thread is not None):
+            self._git_thread.join(self.gitTimeout)
+            if(self._git_thread.is_alive()): # detach from the holder, the late result is ignored
+                self._git_state_ = {"error": "git state not collected within {} s".format(self.gitTimeout)}
+            else:
+                self._git_state_ = self._git_holder["state"]
+            self._git_thread = self._git_holder = None
+        return self._git_state_.get(key)
 
     @Session_t.column
     def git_version(self):
@@ -170,19 +397,32 @@ class Session(Session_t):
             store the current git commit id. 
         """
         # git log --pretty=format:'%H' -n 1
-        return self._git_version_
-
-    def _git_diff(self):
-        repo = Repo(os.path.abspath(self._basedir),search_parent_directories=True)
-        t = repo.head.commit.tree
-        return repo.git.diff(t)
+        return self._git("version")
 
     @Session_t.column
     def git_diff(self):
         """
             store the all changes of the current commit. 
         """
-        return self._git_diff_
+        return self._git("diff")
+
+    @Session_t.column
+    def git_dirty(self):
+        """
+            the files that differ from the current commit
+        """
+        return self._git("dirty")
+
+    @Session_t.column
+    def git_untracked(self):
+        """
+            the number of untracked files and the first of them
+        """
+        return self._git("untracked")
+
+    @Session_t.column
+    def git_error(self):
+        return self._git("error")
 
     @Session_t.column
     def res(self):
@@ -206,11 +446,11 @@ class Session(Session_t):
     
     @Session_t.column
     def stdout(self):
-        return self.stdoutLog.getvalue() if self.terminalLog else None
+        return self.stdoutLog.summary() if self.terminalLog else None
     
     @Session_t.column
     def stderr(self):
-        return self.stderrLog.getvalue() if self.terminalLog else None
+        return self.stderrLog.summary() if self.terminalLog else None
     
 
 """
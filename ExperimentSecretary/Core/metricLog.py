@@ -0,0 +1,101 @@
+"""
+    Log time series (loss curves, errors, ...) during a session into an append-only binary file
+"""
+import array
+import struct
+import threading
+import time
+import os
+
+
+# a block in the file: name length, number of samples, the name, then the columns step(int64), value(float64), time(float64)
+_blockHeader = struct.Struct("<HI")
+
+
+class metricLogger:
+    """
+    Buffer the samples in typed arrays and append them to `filename` in a background thread
+        every `flushInterval` seconds, or as soon as `flushSize` samples are waiting.
+    The file is valid up to the last flush, so a crash loses at most the unflushed samples
+    """
+    def __init__(self, filename, flushInterval = 1.0, flushSize = 1<<16):
+        self.filename = filename
+        self.flushInterval = flushInterval
+        self.flushSize = flushSize
+        self.counts = {}
+        self._buffers = {}
+        self._nbuffered = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok = True)
+        self._file = open(filename, "ab")
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def log(self, name, value, step = None):
+        with self._lock:
+            try:
+                steps, values, times = self._buffers[name]
+            except KeyError:
+                steps, values, times = self._buffers[name] = (array.array("q"), array.array("d"), array.array("d"))
+            n = self.counts.get(name,0)
+            steps.append(n if (step is None) else step)
+            values.append(value)
+            times.append(time.time())
+            self.counts[name] = n+1
+            self._nbuffered += 1
+            if(self._nbuffered >= self.flushSize):
+                self._wake.set()
+
+    def _run(self):
+        while(not self._closed):
+            self._wake.wait(self.flushInterval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            buffers, self._buffers, self._nbuffered = self._buffers, {}, 0
+        if(not len(buffers) or self._file is None):
+            return
+        for name,(steps,values,times) in buffers.items():
+            bname = name.encode()
+            self._file.write(_blockHeader.pack(len(bname), len(steps)) + bname)
+            self._file.write(steps.tobytes() + values.tobytes() + times.tobytes())
+        self._file.flush()
+
+    def close(self):
+        if(self._closed):
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+        self._file = None
+
+
+def readMetrics(filename):
+    """
+    read a metric file, return {name: (steps, values, times)} as numpy arrays
+        a block cut off by a crash at the end of the file is ignored
+    """
+    import numpy as np # only needed to read the metrics, not to log them
+    with open(filename,"rb") as f:
+        data = f.read()
+    parts = {}
+    pos = 0
+    while(pos + _blockHeader.size <= len(data)):
+        namelen, n = _blockHeader.unpack_from(data, pos)
+        start = pos + _blockHeader.size + namelen
+        end = start + 24*n
+        if(end > len(data)):
+            break
+        name = data[pos + _blockHeader.size:start].decode()
+        cols = parts.setdefault(name, ([],[],[]))
+        cols[0].append(np.frombuffer(data, np.int64, n, start))
+        cols[1].append(np.frombuffer(data, np.float64, n, start + 8*n))
+        cols[2].append(np.frombuffer(data, np.float64, n, start + 16*n))
+        pos = end
+    return {name: tuple(np.concatenate(c) for c in cols) for name,cols in parts.items()}
@@ -0,0 +1,121 @@
+"""
+    An sqlite index over the session records in `<basedir>/.exps`, so that the records can be searched without opening every json
+"""
+import json
+import sqlite3
+import os
+import glob
+from datetime import datetime
+
+from .sidecar import loadSession
+
+
+# the columns of the `sessions` table that are taken from the record directly
+_catalogColumns = ["expName", "init_time", "fin_time", "termination", "platform", "git_version"]
+# the bulky record entries that are never put into the `info` table
+_skipInfo = set(_catalogColumns) | {"git_diff", "stdout", "stderr"}
+
+
+def _sqlValue(v):
+    if(isinstance(v,datetime)):
+        return v.replace(tzinfo = None).isoformat() # the json records store naive local time as if it were utc
+    return v
+
+
+def _isScalar(v):
+    return isinstance(v,(bool,int,float)) or (isinstance(v,str) and len(v) <= 256)
+
+
+class SessionCatalog:
+    """
+    The index of the session records under `basedir`
+    basic usage:
+        cat = SessionCatalog(".")
+        for rec in cat.query(expName = "walk", success = True, since = datetime(2020,5,1), platform = "robot-pc"):
+            print(rec["res"])
+    """
+    def __init__(self, basedir = "."):
+        self.expdir = os.path.join(basedir,".exps")
+        self.dbfile = os.path.join(self.expdir,"catalog.sqlite")
+
+    def _connect(self):
+        os.makedirs(self.expdir, exist_ok = True)
+        con = sqlite3.connect(self.dbfile)
+        con.execute("""CREATE TABLE IF NOT EXISTS sessions (file TEXT PRIMARY KEY, expName TEXT, init_time TEXT, fin_time TEXT,
+            termination TEXT, success INTEGER, platform TEXT, git_version TEXT)""")
+        con.execute("CREATE TABLE IF NOT EXISTS info (file TEXT, key TEXT, value, PRIMARY KEY (file, key))")
+        con.execute("CREATE INDEX IF NOT EXISTS sessions_exp ON sessions (expName, init_time)")
+        con.execute("CREATE INDEX IF NOT EXISTS info_key ON info (key, value)")
+        return con
+
+    def _insert(self, con, filename, record):
+        values = [_sqlValue(record.get(c)) for c in _catalogColumns]
+        con.execute("INSERT OR REPLACE INTO sessions VALUES (?,?,?,?,?,?,?,?)",
+            [filename] + values[:4] + [record.get("termination") == "success"] + values[4:])
+        con.execute("DELETE FROM info WHERE file = ?", (filename,))
+        con.executemany("INSERT INTO info VALUES (?,?,?)",
+            [(filename, k, _sqlValue(v)) for k,v in record.items() 
+                if k not in _skipInfo and (_isScalar(v) or isinstance(v,datetime))])
+
+    def add(self, filename, record):
+        """
+        index one record, `filename` is the name of its json file in `.exps`
+        """
+        con = self._connect()
+        with con:
+            self._insert(con, filename, record)
+        con.close()
+
+    def reindex(self):
+        """
+        rebuild the catalog from all the json files in `.exps`
+        """
+        from bson import json_util
+        con = self._connect()
+        with con:
+            con.execute("DELETE FROM sessions")
+            con.execute("DELETE FROM info")
+            for fn in sorted(glob.glob(os.path.join(self.expdir,"*.json"))):
+                try:
+                    with open(fn) as f:
+                        record = json.load(f, object_hook = json_util.object_hook)
+                except ValueError: # not a session record
+                    continue
+                self._insert(con, os.path.basename(fn), record)
+        con.close()
+
+    def query(self, expName = None, success = None, termination = None, platform = None, git_version = None,
+            since = None, until = None, load = True, mmap = False, **info):
+        """
+        yield the records that match all the given conditions, in the order of init_time
+            since, until: datetimes bounding the init_time
+            info: conditions on the other scalar entries of the records, e.g. `learning_rate = 0.1`
+            load: yield the loaded records, otherwise yield the json file paths
+            mmap: memory map the sidecar arrays of the records
+        The records are loaded only when they are iterated over, and their sidecar arrays only when they are used
+        """
+        conds, args = [], []
+        for col,v in [("expName",expName), ("success",success), ("termination",termination),
+                ("platform",platform), ("git_version",git_version)]:
+            if(v is not None):
+                conds.append("{} = ?".format(col))
+                args.append(v)
+        if(since is not None):
+            conds.append("init_time >= ?")
+            args.append(_sqlValue(since))
+        if(until is not None):
+            conds.append("init_time < ?")
+            args.append(_sqlValue(until))
+        for k,v in info.items():
+            conds.append("file IN (SELECT file FROM info WHERE key = ? AND value = ?)")
+            args += [k, _sqlValue(v)]
+        sql = "SELECT file FROM sessions"
+        if(len(conds)):
+            sql += " WHERE " + " AND ".join(conds)
+        sql += " ORDER BY init_time"
+        con = self._connect()
+        files = [r[0] for r in con.execute(sql, args)]
+        con.close()
+        for fn in files:
+            path = os.path.join(self.expdir, fn)
+            yield loadSession(path, mmap) if load else path
@@ -0,0 +1,88 @@
+"""
+    Keep the large arrays of a session record in `.npy` files next to its json, the json only holds a reference to them
+"""
+import json
+import os
+import re
+
+
+class sidecarArray:
+    """
+    The reference to an array stored in a sidecar file, the array is loaded only when it is asked for
+        np.asarray(ref) or ref.load() gives the array
+    """
+    def __init__(self, filename, shape, dtype, mmap = False):
+        self.filename = filename
+        import numpy as np # numpy is imported when it is needed, not with the package
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.mmap = mmap
+
+    def load(self):
+        import numpy as np
+        return np.load(self.filename, mmap_mode = "r" if self.mmap else None)
+
+    def __array__(self, dtype = None, copy = None):
+        arr = self.load()
+        return arr if (dtype is None) else arr.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return "sidecarArray({}, shape={}, dtype={})".format(self.filename, self.shape, self.dtype)
+
+
+def _asNumeric(v):
+    """
+    the value as a numeric numpy array if it is one or a list of numbers, otherwise None
+    """
+    import numpy as np
+    if(isinstance(v,np.ndarray)):
+        return v if (v.dtype.kind in "biufc") else None
+    if(isinstance(v,(list,tuple)) and len(v) and isinstance(v[0],(int,float,list,tuple,np.generic))):
+        try:
+            arr = np.asarray(v)
+        except ValueError: # ragged
+            return None
+        return arr if (arr.dtype.kind in "biuf") else None
+    return None
+
+
+def writeSidecars(record, expdir, stem, minSize = 1000):
+    """
+    replace the numeric arrays (and lists of numbers) with at least `minSize` elements in the record by
+        references to `<expdir>/<stem>.<key>.npy`. Smaller numpy values are turned into plain python values
+    return the record to be dumped into json
+    """
+    import numpy as np
+    def convert(v, key):
+        if(isinstance(v,dict)):
+            return {k: convert(x, "{}.{}".format(key,k)) for k,x in v.items()}
+        if(isinstance(v,np.generic)):
+            return v.item()
+        arr = _asNumeric(v)
+        if(arr is not None and arr.size >= minSize):
+            filename = "{}.{}.npy".format(stem, re.sub(r"[^\w.-]", "_", key))
+            np.save(os.path.join(expdir,filename), arr, allow_pickle = False)
+            return {"$sidecar": filename, "shape": list(arr.shape), "dtype": arr.dtype.str}
+        if(isinstance(v,np.ndarray)):
+            return v.tolist()
+        if(isinstance(v,(list,tuple))):
+            return [convert(x, "{}.{}".format(key,i)) for i,x in enumerate(v)]
+        return v
+    return {k: convert(v,k) for k,v in record.items()}
+
+
+def loadSession(filename, mmap = False):
+    """
+    load a session record, the sidecar references are turned into `sidecarArray`s (loaded lazily, memory mapped if `mmap`)
+    """
+    from bson import json_util
+    expdir = os.path.dirname(filename)
+    def hook(d):
+        if("$sidecar" in d):
+            return sidecarArray(os.path.join(expdir,d["$sidecar"]), d["shape"], d["dtype"], mmap)
+        return json_util.object_hook(d)
+    with open(filename) as f:
+        return json.load(f, object_hook = hook)
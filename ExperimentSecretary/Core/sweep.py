@@ -0,0 +1,45 @@
+"""
+    Run a parameter sweep, one Session per configuration, in a process pool
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import itertools
+import uuid
+
+from .expSession import collectGitState
+
+
+def grid(**axes):
+    """
+    all the combinations of the given values, e.g. grid(lr = [0.1, 0.01], seed = [0, 1]) gives 4 configurations
+    """
+    keys = list(axes.keys())
+    return [dict(zip(keys,vals)) for vals in itertools.product(*[axes[k] for k in keys])]
+
+
+def _runPoint(sessionClass, expName, basedir, recordName, gitState, sessionKwargs, config):
+    s = sessionClass(expName, basedir = basedir, gitState = gitState, recordName = recordName, **sessionKwargs, **config)
+    s()
+    return {"record": recordName, "config": config, "termination": s._termination, "res": getattr(s,"_res",None)}
+
+
+def sweep(sessionClass, configs, expName = None, basedir = ".", workers = None, 
+        gitPolicy = "full", gitDiffLimit = 1<<20, **sessionKwargs):
+    """
+    run `sessionClass(expName, **config)()` for each config in a process pool, the config ends up in `Session Parameters`
+        (and in `self.params` for the body to read). The class must be importable by the workers (defined at module level)
+    Each run gets its own record `<time>-<sweep id>-<index>`, the git state is collected once for the whole sweep
+    return the list of {"record", "config", "termination", "res"} in the order of `configs`
+    basic usage:
+        class Train(Session):
+            def body(self):
+                self._res = train(**self.params)
+        results = sweep(Train, grid(lr = [0.1, 0.01], seed = range(3)), expName = "train", workers = 6)
+    """
+    gitState = collectGitState(basedir, gitPolicy, gitDiffLimit) if (gitPolicy != "skip") else {}
+    stem = "{}-{}".format(datetime.now().strftime("%Y-%m-%d-%H_%M_%S"), uuid.uuid4().hex[:6])
+    with ProcessPoolExecutor(max_workers = workers) as ex:
+        futures = [ex.submit(_runPoint, sessionClass, expName, basedir, "{}-{:04d}".format(stem,i), gitState,
+                dict(sessionKwargs, gitPolicy = gitPolicy), config)
+            for i,config in enumerate(configs)]
+        return [f.result() for f in futures]
@@ -1,6 +1,18 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import re
+import os
+import time
+import json
+import gzip
+import bz2
+import lzma
+import queue
+import threading
+from itertools import accumulate, chain, islice
+from operator import length_hint
+from concurrent.futures import ProcessPoolExecutor
+
+from .. import _lazy # matplotlib.pyplot is imported by `_lazy.importPyplot` when something is plotted
 
 
 def convertTime(timearray, zerotime = None):
@@ -26,13 +38,47 @@ class readPassInit(FSMreader):
     def __init__(self, triggers = None ,readers = None):
         self.triggers = triggers if (triggers is not None) else []
         self.readers = readers if (readers is not None) else []
+        self._compiledFor = None
+        self._matcher = None
+
+    def addTrigger(self,trigger,reader):
+        self.triggers.append(trigger)
+        self.readers.append(reader)
+        self._compiledFor = None
+
+    def matcher(self):
+        """
+        All the triggers compiled into one alternation regex, so that a line that contains none of them is rejected in one scan.
+            The regex is rebuilt whenever the trigger list changed (also when `triggers` is appended to directly)
+        """
+        if(self._compiledFor != self.triggers):
+            self._compiledFor = list(self.triggers)
+            self._matcher = re.compile("|".join(re.escape(t) for t in self.triggers)) if len(self.triggers) else None
+        return self._matcher
+
+    def dispatch(self,a):
+        """
+        return the reader of the first trigger (in registration order) contained in `a`, same as the plain loop would pick
+        """
+        for t,r in zip(self.triggers,self.readers):
+            if(t in a):
+                return r
+        return None
+
     def __call__(self,f,msg):
+        matcher = self.matcher()
+        search = matcher.search if (matcher is not None) else (lambda a: None)
+        skipUntil = getattr(f,"skipUntil",None) if (matcher is not None) else None
         a = msg if (msg is not None) else f.readline()
+        lines = 0
         while(True):
-            for t,r in zip(self.triggers,self.readers):
-                if(t in a):
-                    return r, a
+            if(search(a) is not None):
+                return self.dispatch(a), a
+            if(lines == 4 and skipUntil is not None): # the triggers are often close to each other, search ahead only after a few lines
+                a = skipUntil(matcher)
+                return (self.dispatch(a) if a!="" else None), a
             a = f.readline()
+            lines += 1
             if(a==""):
                 return None, a
 
@@ -48,42 +94,110 @@ class readVector(FSMreader):
     we assume that each reader have one const form of vectors, thus this class first try these forms and set 
     to one of them once decided in the first call.
     I think this will be faster than using if in every iteration
+
+    batch: if not None, the readers only collect the text of the vectors, and decode `batch` of them with one numpy call
+        the collected ones are decoded and stored when `flush` is called (the parsers call it when they finish)
     """
-    def __init__(self,sep  = ' '):
+    def __init__(self,sep  = ' ', batch = None):
         self.readvector = self.readfunc0
+        self.readtext = self.readtext0
         self.sep = sep
+        self.batch = batch
+        self._pending = [] # (time stamp or None, vector text)
 
 
-    def readfunc0(self,f,msg):
+    def readtext0(self,f,msg):
         """
-        the init func to be called, which tries each form and set the `self.readvector`
+        the init func of `self.readtext`, decides the form from the first vector
         msg should be the vector or the first line of the vector if it has linebreaks
         """
-        try:
-            # vecstr = msg[msg.index('[')+1:]
-            vec = self.readfuncNPStyle(f,msg)
-            self.readvector = self.readfuncNPStyle
-        except ValueError as ex: 
-            vec = self.readfuncNoBrackets(f,msg)
-            self.readvector = self.readfuncNoBrackets
-        return vec
+        if(msg == ""): # the end of the file, nothing to decide the form from
+            return ""
+        self.readtext = self.readtextNPStyle if ('[' in msg) else self.readtextNoBrackets
+        return self.readtext(f,msg)
 
 
-    def readfuncNPStyle(self, f,msg):
+    def readtextNPStyle(self, f,msg):
+        if(msg == ""): # the end of the file
+            return ""
         vecstr = msg[msg.index('[')+1:]
         try: # put reading the first line in `try` because I think printing a short vector is the most common case
             vecstr = vecstr[:vecstr.index(']')]
         except ValueError as ex: 
             assert("substring not found") in str(ex)
             a = f.readline()
-            while (']' not in a):
+            while (']' not in a and a != ""):
                 vecstr += " " + a.strip()
-            vecstr += " " + a[:vecstr.index(']')]
-        return np.fromstring(vecstr, sep = self.sep)
+                a = f.readline()
+            vecstr += " " + a[:a.find(']')]
+        return vecstr
+
+
+    def readtextNoBrackets(self, f,msg):
+        return msg.strip()
+
+
+    def readfunc0(self,f,msg):
+        """
+        the init func to be called, which tries each form and set the `self.readvector`
+        """
+        if(msg == ""): # the end of the file, nothing to decide the form from
+            return np.empty(0)
+        self.readvector = self.readfuncNPStyle if ('[' in msg) else self.readfuncNoBrackets
+        return self.readvector(f,msg)
+
+
+    def readfuncNPStyle(self, f,msg):
+        return np.fromstring(self.readtextNPStyle(f,msg), sep = self.sep)
     
 
     def readfuncNoBrackets(self, f,msg):
-        return np.fromstring(msg.strip(), sep = self.sep)
+        return np.fromstring(self.readtextNoBrackets(f,msg), sep = self.sep)
+
+
+    def record(self,f,msg,t = None):
+        """
+        read the vector starting at `msg` and store it (with the time stamp `t` if it is not None)
+            An empty vector (e.g. a log cut off right after the trigger line) is not stored
+        """
+        if(self.batch is None):
+            vec = self.readvector(f,msg)
+            if(not vec.size):
+                return
+            if(t is None):
+                self.stor(vec)
+            else:
+                self.stor(t,vec)
+            return
+        if(len(self._pending) >= self.batch):
+            self.flush()
+        text = self.readtext(f,msg)
+        if(text.strip() != ""):
+            self._pending.append((t,text))
+
+
+    def flush(self):
+        """
+        decode all the collected vector texts with one numpy call and store them
+        """
+        if(not len(self._pending)):
+            return
+        times, texts = zip(*self._pending)
+        self._pending = []
+        width = np.fromstring(texts[0], sep = self.sep).size
+        flat = np.fromstring(self.sep.join(texts), sep = self.sep)
+        if(flat.size != width*len(texts)):
+            raise ValueError("vectors of {} do not have the same length {}".format(self.trigger, width))
+        values = flat.reshape(len(texts),width)
+        times = None if (times[0] is None) else np.array(times, dtype = np.int64)
+        if(hasattr(self.stor,"appendBlock")):
+            self.stor.appendBlock(values, times)
+        elif(times is None):
+            for vec in values:
+                self.stor(vec)
+        else:
+            for t,vec in zip(times,values):
+                self.stor(t,vec)
 
             
 class readPrettyPrint(readVector):
@@ -93,8 +207,8 @@ class readPrettyPrint(readVector):
     -0.577775   0.223376  -0.315034   0.115284 ...
     """
     
-    def __init__(self,stor,trigger,passreader = None):
-        super().__init__()
+    def __init__(self,stor,trigger,passreader = None, batch = None):
+        super().__init__(batch = batch)
         self.stor = stor
         self.passreader = passreader
         self.trigger = trigger
@@ -102,8 +216,7 @@ class readPrettyPrint(readVector):
         msg = f.readline() if (msg is None) else msg
         assert(self.trigger in msg)
         a = f.readline()
-        vec = self.readvector(f,a)
-        self.stor(vec)
+        self.record(f,a)
         return self.passreader, None
 
 
@@ -113,8 +226,8 @@ class readOnelineVector(readVector):
     xxxxxxx [-0.577775   0.223376  -0.315034   0.115284]
     Note: if there is no brackts, the array should just follows the trigger
     """
-    def __init__(self,stor,trigger, passreader = None, sep = ' '):
-        super().__init__(sep = sep)
+    def __init__(self,stor,trigger, passreader = None, sep = ' ', batch = None):
+        super().__init__(sep = sep, batch = batch)
         self.stor = stor
         self.passreader = passreader
         self.trigger = trigger
@@ -123,8 +236,7 @@ class readOnelineVector(readVector):
     def __call__(self,f,msg=None):
         msg = f.readline() if (msg is None) else msg
         assert(self.trigger in msg)
-        vec = self.readvector(f,msg[len(self.trigger):])
-        self.stor(vec)
+        self.record(f,msg[len(self.trigger):])
         return self.passreader, None
 
 
@@ -135,8 +247,8 @@ class readTimedPrettyPrint(readVector):
     xxxxxxx
     -0.577775   0.223376  -0.315034   0.115284 ...
     """
-    def __init__(self,stor,trigger,passreader = None):
-        super().__init__()
+    def __init__(self,stor,trigger,passreader = None, batch = None):
+        super().__init__(batch = batch)
         self.stor = stor
         self.passreader = passreader
         self.trigger = trigger
@@ -145,10 +257,11 @@ class readTimedPrettyPrint(readVector):
         assert(self.trigger in msg)
         t = int(msg.strip().split(" ")[-1])
         a = f.readline()
+        if(a == ""): # the log ends right after the time stamp
+            return self.passreader, None
         assert(self.trigger[:-11] in a)
         a = f.readline()
-        vec = self.readvector(f,a)
-        self.stor(t,vec)
+        self.record(f,a,t)
         return self.passreader, None
 
 
@@ -157,6 +270,7 @@ class readRegularExpression(FSMreader):
     The class that read a regular expression
         It calls `findall` of a regular expression and pass the result directly to stor
     And the reader will keep on reading until the findall finally matches something
+    (To extract typed records from a whole file, `RegexParser` is much faster)
     """
     def __init__(self,stor,trigger,rgex=r"(.*)",passreader = None):
         super().__init__()
@@ -164,13 +278,16 @@ class readRegularExpression(FSMreader):
         self.passreader = passreader
         self.trigger = trigger
         self.rgex = rgex
+        self.findall = re.compile(rgex).findall
 
     def __call__(self,f,msg=None):
         msg = f.readline() if (msg is None) else msg
-        res = re.findall(self.rgex, msg)
+        res = self.findall(msg)
         while(not len(res)):
             msg = f.readline()
-            res = re.findall(self.rgex, msg)
+            if(msg == ""):
+                return self.passreader, None
+            res = self.findall(msg)
         self.stor(res)
         return self.passreader, None
 
@@ -179,6 +296,53 @@ class readRegularExpression(FSMreader):
 ################## Stor #################################################
 #############################################################################
 
+def _identity(x):
+    return x
+
+
+def decimateMinMax(y, nbuckets):
+    """
+    the indices of the min and max of `y` in each of `nbuckets` equal buckets (and the two ends), sorted
+        keeps the peaks of the curve when it is plotted with much fewer points
+    """
+    N = len(y)
+    if(N <= 2*nbuckets+2):
+        return np.arange(N)
+    bs = N // nbuckets
+    m = nbuckets*bs
+    blocks = y[:m].reshape(nbuckets,bs)
+    base = np.arange(nbuckets)*bs
+    idx = [base + np.argmin(blocks,axis = 1), base + np.argmax(blocks,axis = 1), [0, N-1]]
+    if(m < N):
+        idx.append([m + np.argmin(y[m:]), m + np.argmax(y[m:])])
+    return np.unique(np.concatenate(idx))
+
+
+def decimateLTTB(x, y, n):
+    """
+    the indices of `n` points picked by Largest-Triangle-Three-Buckets, which keeps the visual shape of the curve
+        x: None for equally spaced samples
+    """
+    N = len(y)
+    if(n >= N or n < 3):
+        return np.arange(N)
+    x = np.arange(N, dtype = float) if (x is None) else np.asarray(x, dtype = float)
+    bounds = np.linspace(1, N-1, n-1).astype(np.int64) # n-2 buckets between the two ends
+    # the mean point of each bucket, the last "next bucket" is the end point
+    counts = np.diff(bounds)
+    meanx = np.append(np.add.reduceat(x[:N-1], bounds[:-1]) / counts, x[-1])
+    meany = np.append(np.add.reduceat(y[:N-1], bounds[:-1]) / counts, y[-1])
+    out = np.empty(n, dtype = np.int64)
+    out[0], out[-1] = 0, N-1
+    a = 0
+    for i in range(n-2):
+        lo,hi = bounds[i], bounds[i+1]
+        area = np.abs((x[a]-meanx[i+1])*(y[lo:hi]-y[a]) - (x[a]-x[lo:hi])*(meany[i+1]-y[a]))
+        a = lo + np.argmax(area)
+        out[i+1] = a
+    return out
+
+
 class simpleStor():
     """
     This is just a list with stor's interface
@@ -193,128 +357,1240 @@ class simpleStor():
     def clear(self):
         self.stor = []
 
+    def extend(self,other):
+        """
+        append all the records of another stor of the same type
+        """
+        self.stor.extend(other.stor)
+
+    def truncate(self,n):
+        """
+        drop the records after the first `n`
+        """
+        del self.stor[n:]
+
+    def __len__(self):
+        return len(self.stor)
+
 class simpleVecterStor(simpleStor):
     """
     The stor for readPrettyPrint
+        The vectors are kept in one preallocated 2-D float buffer that doubles when it is full,
+        `values` is a view of the filled rows (no copy)
+        Note: `stor` used to be a list of the vectors, it is now the same array view as `values`.
+            It has no `append`/`clear` (call the stor or `clear` it instead), and all the vectors must have the same length
+        The `show` functions plot at most about `maxPoints` points per curve (see `decimation`)
     """
-    def __init__(self,name,dimnames = ["x","y","z"]):
-        super().__init__(name)
+    def __init__(self,name,dimnames = ["x","y","z"], capacity = 1024):
+        self.name = name
         self.dimNames = dimnames
+        self.capacity = capacity
+        self._buf = None
+        self._len = 0
+        self._decim = {} # the cached decimation indices, valid while the length is `_decimLen`
+        self._decimLen = 0
+
+    def _reserve(self,n,width):
+        """
+        make sure there is space for `n` more rows
+        """
+        if(self._buf is None):
+            self._buf = np.empty((max(self.capacity,n),width))
+        elif(self._len + n > len(self._buf)):
+            buf = np.empty((max(2*len(self._buf),self._len+n),self._buf.shape[1]))
+            buf[:self._len] = self._buf[:self._len]
+            self._buf = buf
+
     def __call__(self,vec):
-        self.stor.append(vec)
-    def show(self,dims = [0,1,2],ax = None, dimnames = None, legend_title = True, timeStamps = None, func = (lambda x: x)):
+        vec = np.asarray(vec,dtype = float).reshape(-1)
+        self._reserve(1,len(vec))
+        if(len(vec) != self._buf.shape[1]):
+            raise ValueError("the stor '{}' holds vectors of length {}, got {}".format(self.name, self._buf.shape[1], len(vec)))
+        self._buf[self._len] = vec
+        self._len += 1
+
+    def appendBlock(self,values,timestamps = None):
+        """
+        append the rows of a 2-D array at once
+        """
+        if(not len(values)):
+            return
+        self._reserve(len(values),values.shape[1])
+        self._buf[self._len:self._len+len(values)] = values
+        self._len += len(values)
+
+    def extend(self,other):
+        self.appendBlock(other.values)
+
+    def truncate(self,n):
+        self._len = min(n,self._len)
+        self._invalidate()
+
+    def _invalidate(self):
+        """
+        drop the cached plotting data, needed when the rows change without the length growing
+        """
+        self._decimLen = -1
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def values(self):
+        return self._buf[:self._len] if (self._buf is not None) else np.empty((0,0))
+
+    @property
+    def stor(self):
+        # kept for the users that read `stor` as the records, an array view now (not a list)
+        return self.values
+
+    @stor.setter
+    def stor(self,vecs):
+        self.clear()
+        for v in vecs:
+            self(v)
+
+    def clear(self):
+        self._buf = None
+        self._len = 0
+        self._invalidate()
+
+    def decimation(self, dims, maxPoints = 10000, method = "minmax", x = None):
+        """
+        the indices of the samples to plot for the dims, cached until the stor changes
+            method: "minmax" keeps the min and max of every bucket of samples (of every dim in `dims`),
+                    "lttb" picks the points by Largest-Triangle-Three-Buckets on the first dim of `dims`
+        """
+        if(self._decimLen != self._len):
+            self._decim = {}
+            self._decimLen = self._len
+        dims = tuple(np.array(dims).reshape(-1))
+        key = (dims, maxPoints, method, x is None)
+        try:
+            return self._decim[key]
+        except KeyError:
+            pass
+        values = self.values
+        if(method == "lttb"):
+            idx = decimateLTTB(x, values[:,dims[0]], maxPoints)
+        else:
+            idx = np.unique(np.concatenate([decimateMinMax(values[:,d], max(1,maxPoints//(2*len(dims)))) for d in dims]))
+        self._decim[key] = idx
+        return idx
+
+    def _plotIndex(self, dims, maxPoints, method, x = None):
+        if(maxPoints is None or self._len <= maxPoints):
+            return slice(None)
+        return self.decimation(dims, maxPoints, method, x)
+
+    def show(self,dims = [0,1,2],ax = None, dimnames = None, legend_title = True, timeStamps = None, func = _identity,
+            maxPoints = 10000, decimate = "minmax"):
+        """
+        maxPoints: above this number of samples the curves are decimated with the method `decimate`, None to plot all
+            (the decimation is computed on the values before `func`)
+        """
+        plt = _lazy.importPyplot()
         if(dimnames is None):
             dimnames = self.dimNames
-        values = np.array(self.stor)
+        values = self.values
         if(ax is None):
             ax = plt.gca()
+        if(timeStamps is not None):
+            timeStamps = np.asarray(timeStamps) # a list is fine too, it is indexed by the decimation indices
+        withTime = timeStamps is not None and len(timeStamps) == len(values)
         for d in np.array(dims).reshape(-1):
-            try:
-                ax.plot(timeStamps,func(values[:,d]),label = dimnames[d])
-            except ValueError as ex:
-                ax.plot(func(values[:,d]),label = dimnames[d])
+            idx = self._plotIndex(d, maxPoints, decimate, timeStamps if withTime else None)
+            x = timeStamps[idx] if withTime else np.arange(len(values))[idx]
+            ax.plot(x,func(values[idx,d]),label = dimnames[d])
                 
         if(legend_title):
             ax.legend()
             plt.title(self.name)
         return ax
     
-    def show2d(self, xdim, ydim, ax = None, label = None):
-        values = np.array(self.stor)
+    def show2d(self, xdim, ydim, ax = None, label = None, maxPoints = 10000):
+        values = self.values
         if(ax is None):
-            ax = plt.gca()
-        ax.plot(values[:,xdim], values[:,ydim],label = label)
+            ax = _lazy.importPyplot().gca()
+        idx = self._plotIndex((xdim,ydim), maxPoints, "minmax")
+        ax.plot(values[idx,xdim], values[idx,ydim],label = label)
         return ax
 
-    def show3d(self, xdim, ydim, zdim = None, ax = None, label = None):
-        values = np.array(self.stor)
+    def show3d(self, xdim, ydim, zdim = None, ax = None, label = None, maxPoints = 10000):
+        values = self.values
         if(ax is None):
-            ax = plt.add_subplot(111, projection='3d') 
-        zvalue = values[:,zdim]
-        ax.plot(values[:,xdim], values[:,ydim], zvalue , label = label)
+            ax = _lazy.importPyplot().add_subplot(111, projection='3d') 
+        idx = self._plotIndex((xdim,ydim,zdim), maxPoints, "minmax")
+        zvalue = values[idx,zdim]
+        ax.plot(values[idx,xdim], values[idx,ydim], zvalue , label = label)
         return ax
 
 
 class simpleTimedVecterStor(simpleVecterStor):
     """
     The stor for readTimedPrettyPrint
+        The time stamps are kept in an int64 column next to the vector buffer
+        `window`, `at` and `bucketReduce` take times in seconds after `zerotime` and binary search the time stamps.
+            zerotime defaults to the time stamp of the first record, as in `convertTime` (also when the log is not sorted)
+            They return views of the buffers as long as the time stamps are sorted
     """
-    def __init__(self,name,dimnames = ["x","y","z"]):
-        super().__init__(name,dimnames)
-        self.timeStamps = []
-    
+    def __init__(self,name,dimnames = ["x","y","z"], capacity = 1024):
+        super().__init__(name,dimnames,capacity)
+        self._times = None
+        self._timeCache = (None, None) # ((length, zerotime), converted time)
+        self._timeIndex = (0, None) # (checked length, None if sorted else the argsort of the time stamps)
+
+    def _reserve(self,n,width):
+        super()._reserve(n,width)
+        if(self._times is None or len(self._times) < len(self._buf)):
+            times = np.empty(len(self._buf),dtype = np.int64)
+            if(self._times is not None):
+                times[:self._len] = self._times[:self._len]
+            self._times = times
+
     def __call__(self,t,vec):
         super().__call__(vec)
-        self.timeStamps.append(t)
+        self._times[self._len-1] = t
+
+    def appendBlock(self,values,timestamps = None):
+        n = self._len
+        super().appendBlock(values)
+        if(len(values)):
+            self._times[n:self._len] = timestamps
+
+    def extend(self,other):
+        self.appendBlock(other.values,other.timestamps)
+
+    def _invalidate(self):
+        super()._invalidate()
+        self._timeCache = (None, None)
+        self._timeIndex = (0, None)
 
-    def show(self,dims = [0,1,2],ax = None, legend_title = True, zerotime = None):
+    @property
+    def timestamps(self):
+        return self._times[:self._len] if (self._times is not None) else np.empty(0,dtype = np.int64)
+
+    @property
+    def timeStamps(self):
+        return self.timestamps
+
+    def show(self,dims = [0,1,2],ax = None, legend_title = True, zerotime = None, maxPoints = 10000, decimate = "minmax"):
         return super().show(dims = dims, ax = ax, legend_title = legend_title, 
-            timeStamps=convertTime(self.timeStamps,zerotime))
+            timeStamps=self.convertedTime(zerotime), maxPoints = maxPoints, decimate = decimate)
+
+    def convertedTime(self, zerotime = None):
+        """
+        `convertTime` of the time stamps, cached until the stor changes
+        """
+        key = (self._len, zerotime)
+        if(self._timeCache[0] != key):
+            self._timeCache = (key, convertTime(self.timestamps,zerotime))
+        return self._timeCache[1]
+
+    def _timeOrder(self):
+        """
+        None if the time stamps are sorted (only the new ones are checked), otherwise their stable argsort
+        """
+        checked, order = self._timeIndex
+        if(checked != self._len):
+            if(order is None):
+                t = self._times[max(checked-1,0):self._len]
+                if(np.all(t[1:] >= t[:-1])):
+                    self._timeIndex = (self._len, None)
+                    return None
+            order = np.argsort(self.timestamps, kind = "stable")
+            self._timeIndex = (self._len, order)
+        return order
+
+    def _zerotime(self, zerotime = None):
+        """
+        the time stamp of time 0: zerotime, or the first record's like `convertTime`
+        """
+        return zerotime if (zerotime is not None) else self.timestamps[0]
+
+    def _stamp(self, t, zerotime = None):
+        """
+        the time stamp of `t` seconds after zerotime, rounded up
+        """
+        zerotime = self._zerotime(zerotime)
+        return np.int64(np.ceil(zerotime + t*1e6))
+
+    def _sorted(self):
+        order = self._timeOrder()
+        if(order is None):
+            return self.timestamps, self.values
+        return self.timestamps[order], self.values[order]
+
+    def windowSlice(self, t0 = None, t1 = None, zerotime = None):
+        """
+        the slice of the sorted records with t0 <= t < t1, None means unbounded
+        """
+        if(self._len == 0):
+            return slice(0,0)
+        stamps = self._sorted()[0]
+        i = np.searchsorted(stamps, self._stamp(t0,zerotime)) if (t0 is not None) else 0
+        j = np.searchsorted(stamps, self._stamp(t1,zerotime)) if (t1 is not None) else len(stamps)
+        return slice(int(i), int(max(i,j)))
+
+    def window(self, t0 = None, t1 = None, zerotime = None):
+        """
+        (time stamps, values) of the records with t0 <= t < t1
+            e.g. `stor.window(fall-1, fall+1)` for the 2 s around the time `fall`
+        """
+        sl = self.windowSlice(t0, t1, zerotime)
+        stamps, values = self._sorted()
+        return stamps[sl], values[sl]
+
+    def at(self, t, mode = "nearest", zerotime = None):
+        """
+        (time stamp, values) of the record nearest to `t`, or of the last record at or before `t` if mode is "previous"
+        """
+        if(self._len == 0):
+            raise IndexError("the stor '{}' is empty".format(self.name))
+        stamps, values = self._sorted()
+        s = self._zerotime(zerotime)
+        s = s + t*1e6
+        i = int(np.searchsorted(stamps, np.int64(np.floor(s)), side = "right")) - 1 # the last record at or before s
+        if(mode == "nearest"):
+            if(i < 0 or (i+1 < len(stamps) and stamps[i+1] - s < s - stamps[i])):
+                i += 1
+        elif(mode != "previous"):
+            raise ValueError("unknown mode '{}'".format(mode))
+        elif(i < 0):
+            raise IndexError("no record before {} s".format(t))
+        return stamps[i], values[i]
+
+    def bucketReduce(self, bucket, how = "mean", t0 = None, t1 = None, zerotime = None):
+        """
+        reduce the values in fixed time buckets of `bucket` seconds from t0 to t1
+            how: "mean", "min", "max" or "rms"
+        return the start time of the buckets (seconds after zerotime) and an array of (buckets, dims), NaN for the empty buckets
+        """
+        if(self._len == 0):
+            return np.empty(0), np.empty((0, len(self.dimNames)))
+        stamps, values = self._sorted()
+        zerotime = self._zerotime(zerotime)
+        start = self._stamp(t0,zerotime) if (t0 is not None) else stamps[0]
+        end = self._stamp(t1,zerotime) if (t1 is not None) else stamps[-1] + 1
+        width = bucket*1e6
+        nb = max(int(np.ceil((end - start)/width)), 0)
+        edges = np.ceil(start + np.arange(nb+1)*width).astype(np.int64)
+        edges[-1] = min(edges[-1], end)
+        idx = np.searchsorted(stamps, edges)
+        counts = np.diff(idx)
+        out = np.full((nb, values.shape[1]), np.nan)
+        full = counts > 0
+        if(full.any()):
+            v = values[idx[0]:idx[-1]]
+            offsets = idx[:-1][full] - idx[0]
+            n = counts[full][:,None]
+            if(how == "mean"):
+                out[full] = np.add.reduceat(v, offsets) / n
+            elif(how == "rms"):
+                out[full] = np.sqrt(np.add.reduceat(v*v, offsets) / n)
+            elif(how == "min"):
+                out[full] = np.minimum.reduceat(v, offsets)
+            elif(how == "max"):
+                out[full] = np.maximum.reduceat(v, offsets)
+            else:
+                raise ValueError("unknown reduction '{}'".format(how))
+        return (edges[:-1] - zerotime)/1e6, out
     
     def clear(self):
         super().clear()
-        self.timeStamps = []
+        self._times = None
+
+
+class mappedVecterStor(simpleVecterStor):
+    """
+    A simpleVecterStor kept on disk, for the logs that do not fit in memory
+        The rows are appended to the raw float64 file `<path>.values`, only a write buffer of `bufferRows` rows stays in RAM.
+        `values` is a read only np.memmap of the file, so `show`, `show2d` and slicing work as usual.
+        `<path>.json` holds the name, dimnames, width and length, the stor can be opened again later with `openStor(path)`
+        mode: "a" to keep the rows already in the files, "w" to start over
+    The files never shrink in place, since that would crash a process still holding a `values` view (SIGBUS):
+        `truncate` only lowers the length in the header and the next rows overwrite the dropped ones,
+        `clear` (and mode "w") swap in new empty files, the old views keep the old data
+    """
+    _columns = (("values", np.float64),)
+
+    def __init__(self, path, name = None, dimnames = ["x","y","z"], bufferRows = 1<<14, mode = "a"):
+        header = _readHeader(path) if (mode == "a") else None
+        if(header is not None):
+            name, dimnames = header["name"], header["dimnames"]
+        super().__init__(name if (name is not None) else os.path.basename(path), dimnames)
+        self.path = path
+        self.bufferRows = bufferRows
+        self._width = header["width"] if (header is not None) else None
+        self._len = header["length"] if (header is not None) else 0 # the rows in the files
+        self._pending = [] # the blocks of the write buffer, one list of arrays per column
+        self._npending = 0
+        self._files = None
+        if(header is None):
+            self._newFiles()
+            self._writeHeader()
+        else:
+            self.truncate(self._len) # drop the rows written after the last header
+        self._map()
+
+    def _filename(self, col):
+        return "{}.{}".format(self.path, col)
+
+    def _newFiles(self):
+        """
+        replace the data files by empty ones, the maps of the old files stay valid
+        """
+        self._closeFiles()
+        for col,_ in self._columns:
+            tmpname = self._filename(col) + ".tmp"
+            open(tmpname,"wb").close()
+            os.replace(tmpname, self._filename(col))
+
+    def _closeFiles(self):
+        if(self._files is not None):
+            for f in self._files:
+                f.close()
+            self._files = None
+
+    def _writeHeader(self):
+        header = {"name": self.name, "dimnames": list(self.dimNames), "width": self._width, "length": self._len,
+            "timed": isinstance(self, simpleTimedVecterStor)}
+        tmpname = self.path + ".json.tmp"
+        with open(tmpname,"w") as f:
+            json.dump(header, f)
+        os.replace(tmpname, self.path + ".json")
+
+    def _map(self):
+        """
+        map the rows in the files
+        """
+        if(self._len == 0):
+            self._buf = self._times = None
+            return
+        maps = [np.memmap(self._filename(col), dtype = dtype, mode = "r",
+            shape = (self._len, self._width) if (col == "values") else (self._len,)) for col,dtype in self._columns]
+        self._buf = maps[0]
+        self._times = maps[1] if (len(maps) > 1) else None
+
+    def _append(self, *columns):
+        values = np.asarray(columns[0], dtype = np.float64)
+        if(not len(values)):
+            return
+        if(self._width is None):
+            self._width = values.shape[1]
+        if(not self._pending):
+            self._pending = [[] for _ in columns]
+        for block,col in zip(self._pending, columns):
+            block.append(np.array(col, dtype = np.float64 if (col is columns[0]) else np.int64))
+        self._npending += len(values)
+        if(self._npending >= self.bufferRows):
+            self.sync()
+
+    def __call__(self, vec):
+        self._append(np.asarray(vec, dtype = np.float64).reshape(1,-1))
+
+    def appendBlock(self, values, timestamps = None):
+        for i in range(0, len(values), self.bufferRows): # a big memmap source is copied in RAM one buffer at a time
+            self._append(values[i:i+self.bufferRows])
+
+    def sync(self):
+        """
+        write the buffered rows to the files, update the header and the maps
+        """
+        if(not self._npending):
+            return
+        if(self._files is None):
+            self._files = [open(self._filename(col),"r+b") for col,_ in self._columns]
+        for (col,dtype),f,blocks in zip(self._columns, self._files, self._pending):
+            f.seek(self._len*(self._width if (col == "values") else 1)*np.dtype(dtype).itemsize) # after a `truncate`, overwrite
+            f.write(np.concatenate(blocks).tobytes())
+            f.flush()
+        self._len += self._npending
+        self._pending = []
+        self._npending = 0
+        self._writeHeader()
+        self._map()
+
+    def __len__(self):
+        return self._len + self._npending
+
+    @property
+    def values(self):
+        self.sync()
+        return super().values
+
+    def _plotIndex(self, dims, maxPoints, method, x = None):
+        self.sync()
+        return super()._plotIndex(dims, maxPoints, method, x)
+
+    def truncate(self, n):
+        self.sync()
+        self._len = min(n, self._len)
+        if(self._len == 0):
+            self._width = None
+            self._newFiles()
+        self._writeHeader()
+        self._map()
+        self._invalidate()
+
+    def clear(self):
+        self._pending = []
+        self._npending = 0
+        self.truncate(0)
+
+    def close(self):
+        self.sync()
+        self._closeFiles()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ex):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class mappedTimedVecterStor(mappedVecterStor, simpleTimedVecterStor):
+    """
+    The simpleTimedVecterStor kept on disk, the time stamps go to the int64 file `<path>.times`
+    """
+    _columns = (("values", np.float64), ("times", np.int64))
+
+    def __call__(self, t, vec):
+        self._append(np.asarray(vec, dtype = np.float64).reshape(1,-1), [t])
+
+    def appendBlock(self, values, timestamps = None):
+        for i in range(0, len(values), self.bufferRows):
+            self._append(values[i:i+self.bufferRows], timestamps[i:i+self.bufferRows])
+
+    @property
+    def timestamps(self):
+        self.sync()
+        return super().timestamps
+
+    def convertedTime(self, zerotime = None):
+        self.sync()
+        return super().convertedTime(zerotime)
+
+    def _timeOrder(self):
+        self.sync()
+        return super()._timeOrder()
+
+
+def _readHeader(path):
+    try:
+        with open(path + ".json") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def openStor(path, bufferRows = 1<<14):
+    """
+    open a stor saved by a `mappedVecterStor` or a `mappedTimedVecterStor`, without parsing the log again
+    """
+    header = _readHeader(path)
+    if(header is None):
+        raise FileNotFoundError("no stor header at {}.json".format(path))
+    cls = mappedTimedVecterStor if header["timed"] else mappedVecterStor
+    return cls(path, bufferRows = bufferRows)
+
+
+def openStors(storDir, bufferRows = 1<<14):
+    """
+    {name: stor} of all the stors saved in `storDir`, e.g. by a `TriggerParser(storDir = ...)`
+    """
+    stors = {}
+    for n in sorted(os.listdir(storDir)):
+        if(n.endswith(".json")):
+            stor = openStor(os.path.join(storDir, n[:-len(".json")]), bufferRows)
+            stors[stor.name] = stor
+    return stors
+
+
+class structuredStor(simpleStor):
+    """
+    The stor for typed records, kept in a NumPy structured array that doubles when it is full
+        schema: {field name: dtype}, e.g. {"t": np.int64, "force": float, "state": "U16"}
+    """
+    def __init__(self,name,schema,capacity = 1024):
+        self.name = name
+        self.dtype = np.dtype(list(schema.items()))
+        self.capacity = capacity
+        self.clear()
+
+    def _reserve(self,n):
+        if(self._len + n > len(self._buf)):
+            buf = np.empty(max(2*len(self._buf),self._len+n,self.capacity),dtype = self.dtype)
+            buf[:self._len] = self._buf[:self._len]
+            self._buf = buf
+
+    def __call__(self,row):
+        self._reserve(1)
+        self._buf[self._len] = tuple(row)
+        self._len += 1
+
+    def appendBlock(self,values):
+        self._reserve(len(values))
+        self._buf[self._len:self._len+len(values)] = values
+        self._len += len(values)
+
+    def extend(self,other):
+        self.appendBlock(other.values)
+
+    def truncate(self,n):
+        self._len = min(n,self._len)
+
+    def clear(self):
+        self._buf = np.empty(0,dtype = self.dtype)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def values(self):
+        return self._buf[:self._len]
+
+    @property
+    def stor(self):
+        return self.values
+
+
+#############################################################################
+##################  LINE SOURCE #############################################
+#############################################################################
+
+compressedOpeners = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+def isCompressed(path):
+    return isinstance(path,str) and os.path.splitext(path)[1] in compressedOpeners
+
+
+class decompressedStream:
+    """
+    A binary file-like reader of a .gz/.bz2/.xz file
+        A background thread decompresses it in big blocks ahead of the reads, so the decompression overlaps the parsing
+        maxPending: the number of decompressed blocks that may wait in memory
+    """
+    def __init__(self, path, blocksize = 1<<22, maxPending = 4):
+        self.f = compressedOpeners[os.path.splitext(path)[1]](path,"rb")
+        self.blocksize = blocksize
+        self._blocks = queue.Queue(maxPending)
+        self._rest = b""
+        self._eof = False
+        self._closed = False
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while(not self._closed):
+                block = self.f.read(self.blocksize)
+                self._put(block)
+                if(not block):
+                    return
+        except Exception as e: # raised again in the reading thread
+            self._put(e)
+
+    def _put(self,item):
+        while(not self._closed):
+            try:
+                self._blocks.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _next(self):
+        item = self._blocks.get()
+        if(isinstance(item,Exception)):
+            self._eof = True
+            raise item
+        self._eof = not item
+        return item
+
+    def read(self, size = -1):
+        if(size is None or size < 0):
+            parts = [self._rest]
+            while(not self._eof):
+                parts.append(self._next())
+            self._rest = b""
+            return b"".join(parts)
+        if(not self._rest and not self._eof):
+            self._rest = self._next()
+        if(size >= len(self._rest)):
+            out, self._rest = self._rest, b""
+        else:
+            out, self._rest = self._rest[:size], self._rest[size:]
+        return out
+
+    def close(self):
+        if(self._closed):
+            return
+        self._closed = True
+        self._thread.join()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*ex):
+        self.close()
+
+
+class LineSource:
+    """
+    A `readline` compatible wrapper of a binary file, which can be passed to the parsers in place of a text file.
+        It reads the file in big blocks, and decodes and splits the complete lines of a span of the block at once,
+        `readline` then hands them out one by one.
+        `skipUntil` searches the decoded span (or the raw block) with a regex, so the lines without a trigger never go through python one by one
+        A path ending with .gz, .bz2 or .xz is decompressed on the fly by a `decompressedStream`
+    basic usage:
+        with LineSource("ctrl.log") as f:
+            parser(f)
+    """
+    # \r\n and the line breaks other than \n that str.splitlines splits at, the spans with them are split at \n line by line
+    _asciiBreaks = ("\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e")
+    _otherBreaks = _asciiBreaks + ("\x85", "\u2028", "\u2029")
+
+    def __init__(self, f, blocksize = 1<<22, encoding = "utf-8", errors = "strict", start = None, end = None, span = 1<<18):
+        """
+        start, end: only read the byte range [start, end) of the file (not for compressed files)
+        span: the bytes of lines decoded at once
+        """
+        self._own = isinstance(f,str)
+        if(self._own and isCompressed(f)):
+            if(start is not None):
+                raise ValueError("a compressed log can not be read from an offset")
+            f = decompressedStream(f, blocksize)
+        elif(self._own):
+            f = open(f,"rb")
+        elif(hasattr(f,"buffer")): # a text mode file, read from its underlying binary buffer
+            f = f.buffer
+        self.f = f
+        self.blocksize = blocksize
+        self.span = span
+        self.encoding = encoding
+        self.errors = errors
+        if(start is not None):
+            self.f.seek(start)
+        self.end = end
+        self.buf = b""
+        self.pos = 0 # the position of the next line in `buf`, or of the decoded lines while there are some
+        self.offset = start if (start is not None) else 0 # the file offset of `buf[0]`
+        self._lineOffset = self.offset
+        self.exhausted = False # set when a read reached the end
+        self._patterns = {}
+        # the lines of `buf[pos:_linesEnd]`, decoded at once, and the iterator that `readline` takes them from
+        self._text = ""
+        self._lines = []
+        self._it = iter(self._lines)
+        self._linesEnd = 0
+        self._ascii = True
+        self._mark = (0, 0) # a decoded line and its char offset in `_text`, moved forward by `_charOffset`
+        self._byteEnds = None # the cumulative byte lengths of `_lines` if they are not ascii, computed when needed
+        self._perLine = 0 # the lines of `buf` before this position are decoded one by one
+        self._newReadline()
+
+    def _fill(self):
+        """
+        drop the consumed part of the buffer and append the next block, return False at the end of the file
+        """
+        size = self.blocksize
+        if(self.end is not None):
+            size = min(size, self.end - self.offset - len(self.buf))
+            if(size <= 0):
+                return False
+        block = self.f.read(size)
+        if(not block):
+            return False
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + block
+        self.pos = 0
+        self._perLine = 0
+        return True
+
+    def _decode(self,line):
+        if(line[-2:] == b"\r\n"):
+            line = line[:-2] + b"\n"
+        return line.decode(self.encoding, self.errors)
+
+    def _decodeLines(self):
+        """
+        decode the complete lines of the next span of the buffer, return False if there are none 
+            or if they must be decoded one by one (with another line break than \n, or an undecodable byte to raise at its line)
+        """
+        while(True):
+            i = self.buf.rfind(b"\n", self.pos, self.pos + self.span)
+            if(i < 0):
+                i = self.buf.find(b"\n", self.pos + self.span)
+            if(i >= 0):
+                break
+            if(not self._fill()):
+                return False
+        chunk = self.buf[self.pos:i+1]
+        try:
+            text = chunk.decode(self.encoding, self.errors)
+        except UnicodeDecodeError:
+            text = None
+        if(text is None or any((c in text) for c in (self._asciiBreaks if text.isascii() else self._otherBreaks))):
+            self._perLine = i+1
+            return False
+        self._text = text
+        self._lines = text.splitlines(keepends = True)
+        self._it = iter(self._lines)
+        self._linesEnd = i+1
+        self._ascii = text.isascii() and len(text) == len(chunk)
+        return True
+
+    def _handedOut(self):
+        """
+        the number of decoded lines already returned
+        """
+        return len(self._lines) - length_hint(self._it)
+
+    def _skipLines(self, n):
+        next(islice(self._it, n, n), None)
+
+    def _charOffset(self, i):
+        """
+        the char offset of the decoded line `i` in `_text`
+        """
+        line, char = self._mark if (i >= self._mark[0]) else (0, 0)
+        char += sum(map(len, self._lines[line:i]))
+        self._mark = (i, char)
+        return char
+
+    def _lineStart(self, i):
+        """
+        the byte offset of the decoded line `i`
+        """
+        if(self._ascii):
+            return self.offset + self.pos + self._charOffset(i)
+        if(self._byteEnds is None):
+            self._byteEnds = list(accumulate(len(l)+1 for l in self.buf[self.pos:self._linesEnd-1].split(b"\n")))
+        return self.offset + self.pos + (self._byteEnds[i-1] if (i > 0) else 0)
+
+    def _dropLines(self):
+        """
+        move `pos` past the decoded lines handed out, and forget the others
+        """
+        n = self._handedOut()
+        if(n == len(self._lines)):
+            if(n):
+                self._lineOffset = self.offset + (self.buf.rfind(b"\n", self.pos, self._linesEnd-1) + 1 or self.pos)
+                self.pos = self._linesEnd
+        else:
+            if(n):
+                self._lineOffset = self._lineStart(n-1)
+                self.pos = self._lineStart(n) - self.offset
+            self._skipLines(len(self._lines) - n) # `readline` goes on with the next span
+        self._text = ""
+        self._lines = []
+        self._it = iter(self._lines)
+        self._mark = (0, 0)
+        self._byteEnds = None
+
+    @property
+    def lineOffset(self):
+        """
+        the byte offset of the line returned last
+        """
+        n = self._handedOut()
+        if(n == 0):
+            return self._lineOffset
+        return self._lineStart(n-1)
+
+    def tell(self):
+        """
+        the byte offset of the next line to be returned
+        """
+        n = self._handedOut()
+        if(n == 0):
+            return self.offset + self.pos
+        return self._lineStart(n)
+
+    def _spans(self):
+        """
+        the lines behind `readline`: the iterator of each decoded span, or one line at a time where the lines are decoded one by one
+        """
+        while(True):
+            self._dropLines()
+            if(self.pos >= self._perLine and self._decodeLines()):
+                yield self._it
+                continue
+            self._lineOffset = self.offset + self.pos
+            i = self.buf.find(b"\n", self.pos)
+            if(i >= 0):
+                line = self.buf[self.pos:i+1]
+                self.pos = i+1
+            elif(not self._fill()):
+                line = self.buf[self.pos:]
+                self.pos = len(self.buf)
+                self.exhausted = True
+            else:
+                continue
+            try:
+                line = self._decode(line)
+            except UnicodeDecodeError:
+                self._newReadline() # this generator ends with the error, the next line comes from a new one
+                raise
+            yield (line,)
+
+    def _newReadline(self):
+        # the lines are handed out by `chain` without a python call per line
+        self.readline = chain.from_iterable(self._spans()).__next__
+
+    def _bytesPattern(self,pattern):
+        if(not isinstance(pattern,str)):
+            pattern = pattern.pattern
+        try:
+            return self._patterns[pattern]
+        except KeyError:
+            p = self._patterns[pattern] = re.compile(pattern.encode(self.encoding))
+            return p
+
+    def skipUntil(self,pattern):
+        """
+        skip the lines until the first line that `pattern` (a str or compiled str regex) is found in, and return that line
+            return "" if the file ends before that
+        """
+        lines = self._lines
+        n = len(lines) - length_hint(self._it)
+        if(n < len(lines)):
+            search = re.compile(pattern).search if isinstance(pattern,str) else pattern.search
+            start = self._charOffset(n)
+            m = search(self._text, start)
+            if(m is not None):
+                i = self._text.rfind("\n", start, m.start()) + 1 or start
+                k = n + self._text.count("\n", start, i)
+                self._mark = (k, i)
+                self._skipLines(k-n)
+                return next(self._it)
+        last = self.lineOffset # stays at the last line handed out if no trigger is found
+        self._skipLines(len(lines) - n) # already searched
+        self._dropLines()
+        search = self._bytesPattern(pattern).search
+        while(True):
+            m = search(self.buf, self.pos)
+            if(m is not None):
+                self.pos = self.buf.rfind(b"\n", self.pos, m.start()) + 1 or self.pos
+                return self.readline()
+            # keep the last incomplete line, it might contain the trigger after the next block is appended
+            self.pos = self.buf.rfind(b"\n", self.pos) + 1 or self.pos
+            if(not self._fill()):
+                self.pos = len(self.buf)
+                self.exhausted = True
+                self._lineOffset = last
+                return ""
+
+    def readchunk(self):
+        """
+        the bytes of all the complete lines in the buffer (reading the next block first if there are none), b"" at the end
+        """
+        self._dropLines()
+        while(True):
+            i = self.buf.rfind(b"\n", self.pos)
+            if(i >= 0):
+                chunk = self.buf[self.pos:i+1]
+                self.pos = i+1
+                return chunk
+            if(not self._fill()):
+                chunk = self.buf[self.pos:]
+                self.pos = len(self.buf)
+                self.exhausted = True
+                return chunk
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if(line == ""):
+            raise StopIteration
+        return line
+
+    def close(self):
+        if(self._own):
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*ex):
+        self.close()
 
 
 #############################################################################
 ##################  PARSERS #################################################
 #############################################################################
 
+class _countingSource:
+    """
+    The file seen by the readers when a parser is profiled, counts the lines handed out and the bytes consumed
+        (the lines skipped inside `LineSource.skipUntil` are counted in the bytes only)
+    """
+    def __init__(self,f):
+        self.f = f
+        self.lines = 0
+        self.chars = 0
+        self._tell = f.tell if isinstance(f,LineSource) else None
+        if(hasattr(f,"skipUntil")): # readPassInit checks for it
+            self.skipUntil = self._skipUntil
+
+    def readline(self):
+        line = self.f.readline()
+        self.lines += 1 if (line != "") else 0
+        self.chars += len(line)
+        return line
+
+    def _skipUntil(self,pattern):
+        line = self.f.skipUntil(pattern)
+        self.lines += 1 if (line != "") else 0
+        return line
+
+    def position(self):
+        return self._tell() if (self._tell is not None) else self.chars
+
+    def __getattr__(self,name):
+        return getattr(self.f,name)
+
+
 class Parser:
     """
     The log parser for processing the experiments
-        When called, it calls its readers one by one according to the FSM transition rule
+        When called, it calls its readers one by one according to the FSM transition rule, until a reader returns None as the next state
+        f: an opened file, a `LineSource` or a path (which may be a .gz, .bz2 or .xz file)
+        profile: count, for every reader, the calls, lines, bytes, records stored and the time spent, see `stats`
     """
-    def __init__(self):
+    def __init__(self, profile = False):
         self.passreader = readPassInit()
         self.readerPtr = self.passreader
+        self.profile = profile
+        self._stats = {}
 
     def __call__(self,f,msg = None):
-        while(True):
-            try:
-                self.readerPtr, msg =  self.readerPtr(f,msg)
-            except TypeError as ex:
-                if(str(ex) == "'NoneType' object is not callable"):
-                    break
-                else:
-                    raise ex
+        if(isinstance(f,str)):
+            with LineSource(f) as src:
+                return self(src,msg)
+        if(self.profile):
+            f = _countingSource(f)
+            while(self.readerPtr is not None):
+                self.readerPtr, msg = self._callReader(self.readerPtr,f,msg)
+        else:
+            while(self.readerPtr is not None):
+                self.readerPtr, msg = self.readerPtr(f,msg)
+        self.flush()
         return msg
 
+    def _label(self,reader):
+        if(reader is self.passreader):
+            return "passreader"
+        return "{} '{}'".format(type(reader).__name__, getattr(reader,"trigger",None))
+
+    def _callReader(self,reader,f,msg):
+        """
+        call the reader and add its costs to the stats, `f` is a `_countingSource`
+        """
+        def records():
+            try:
+                return len(reader.stor) + len(getattr(reader,"_pending",()))
+            except (AttributeError, TypeError):
+                return 0
+        lines, pos, nrec, t = f.lines, f.position(), records(), time.perf_counter()
+        try:
+            return reader(f,msg)
+        finally:
+            st = self._stats.setdefault(self._label(reader), {"calls":0, "lines":0, "bytes":0, "records":0, "seconds":0.})
+            st["calls"] += 1
+            st["seconds"] += time.perf_counter() - t
+            st["lines"] += f.lines - lines
+            st["bytes"] += f.position() - pos
+            st["records"] += records() - nrec
+
+    def stats(self):
+        """
+        the profile of the readers (`profile` must be set): {reader: {calls, lines, bytes, records, seconds}}
+            bytes are exact for a `LineSource` and counted in characters for a text file
+        """
+        return {k: dict(v) for k,v in self._stats.items()}
+
+    def flush(self):
+        """
+        store the vectors that batched readers are still holding
+        """
+        pass
+
 class TriggerParser(Parser):
     """
         A Parser drived by triggers
+            batch: passed to the vector readers added by `addVecParser` and `addTimedVecParser`, see `readVector`
+            storDir: if not None, `addVecParser` and `addTimedVecParser` store the vectors on disk in this directory
+                (see `mappedVecterStor`, they are opened again with `openStors(storDir)`). Not for `parse_parallel`
     """
-    def __init__(self):
-        super().__init__()
+    def __init__(self, batch = None, profile = False, storDir = None):
+        super().__init__(profile)
         self.passreader.triggers = []
         self.passreader.readers = []
+        self.batch = batch
+        self.storDir = storDir
+        if(storDir is not None):
+            os.makedirs(storDir, exist_ok = True)
+        self._offset = 0 # where `parse_incremental` continues
+        self._msg = None
 
     def addVecParser(self,trigger,name,dimnames = ["x","y","z"],parsType = readPrettyPrint):
-        stor = simpleVecterStor(name,dimnames)
-        pars = parsType(stor,trigger,self.passreader)
-        self.passreader.triggers.append(trigger)
-        self.passreader.readers.append(pars)
+        stor = self._makeStor(simpleVecterStor,mappedVecterStor,name,dimnames)
+        pars = self._makeReader(parsType,stor,trigger)
+        self.passreader.addTrigger(trigger,pars)
         return stor
 
     def addTimedVecParser(self,trigger,name,dimnames = ["x","y","z"],parsType = readTimedPrettyPrint):
-        stor = simpleTimedVecterStor(name,dimnames)
-        pars = parsType(stor,trigger,self.passreader)
-        self.passreader.triggers.append(trigger)
-        self.passreader.readers.append(pars)
+        stor = self._makeStor(simpleTimedVecterStor,mappedTimedVecterStor,name,dimnames)
+        pars = self._makeReader(parsType,stor,trigger)
+        self.passreader.addTrigger(trigger,pars)
         return stor
 
+    def _makeStor(self,memoryType,mappedType,name,dimnames):
+        if(self.storDir is None):
+            return memoryType(name,dimnames)
+        path = os.path.join(self.storDir, re.sub(r"[^\w.-]", "_", name))
+        return mappedType(path,name,dimnames,mode = "w")
+
+    def _makeReader(self,parsType,stor,trigger):
+        if(self.batch is None): # only pass `batch` when it is used, so that custom readers need not accept it
+            return parsType(stor,trigger,self.passreader)
+        return parsType(stor,trigger,self.passreader,batch = self.batch)
+
+    def flush(self):
+        for r in self.passreader.readers:
+            if(hasattr(r,"flush")):
+                r.flush()
+            if(hasattr(getattr(r,"stor",None),"sync")): # the stors on disk
+                r.stor.sync()
+
+    def stors(self):
+        """
+        the stors of the registered readers, in the order of the triggers
+        """
+        return [getattr(r,"stor",None) for r in self.passreader.readers]
+
+    def checkpoint(self):
+        """
+        the state needed to continue parsing the same log later: the byte offset, the current reader (by index) and the pending msg
+        """
+        ptr = self.readerPtr
+        return {"offset": self._offset,
+                "reader": None if (ptr is self.passreader) else self.passreader.readers.index(ptr),
+                "msg": self._msg}
+
+    def restore(self,state):
+        self._offset = state["offset"]
+        self.readerPtr = self.passreader if (state["reader"] is None) else self.passreader.readers[state["reader"]]
+        self._msg = state["msg"]
+
+    def _completeEnd(self,f,size):
+        """
+        the offset right after the last complete line of the file, the unfinished line after it is left for the next call
+        """
+        end = size
+        while(end > self._offset):
+            start = max(self._offset, end - (1<<16))
+            f.seek(start)
+            i = f.read(end-start).rfind(b"\n")
+            if(i >= 0):
+                return start + i + 1
+            end = start
+        return self._offset
+
+    def parse_incremental(self,path):
+        """
+        parse only the bytes appended to `path` since the last call, the new records are appended to the stors
+            A record that runs into the unfinished end of the file is dropped and read again in the next call.
+            return the number of records read
+        """
+        if(isCompressed(path)):
+            raise ValueError("a compressed log can not be parsed incrementally: {}".format(path))
+        size = os.path.getsize(path)
+        if(size < self._offset): # the log was truncated or rotated, start over
+            for stor in self.stors():
+                if(stor is not None):
+                    stor.clear()
+            self.restore({"offset":0, "reader":None, "msg":None})
+        count = 0
+        with open(path,"rb") as fb:
+            end = self._completeEnd(fb,size)
+            if(end <= self._offset):
+                return count
+            f = LineSource(fb, start = self._offset, end = end)
+            if(self.profile):
+                f = _countingSource(f)
+                call = self._callReader
+            else:
+                call = lambda r,f,msg: r(f,msg)
+            msg = self._msg
+            while(self.readerPtr is not None):
+                if(self.readerPtr is self.passreader):
+                    self.readerPtr, msg = call(self.passreader,f,msg)
+                    continue
+                reader = self.readerPtr
+                recordStart = f.lineOffset
+                if(getattr(reader,"batch",None) is not None and len(reader._pending) >= reader.batch):
+                    reader.flush() # so that the record below does not flush, and its text can still be dropped
+                stor = getattr(reader,"stor",None)
+                n = len(stor) if (stor is not None) else 0
+                npending = len(getattr(reader,"_pending",()))
+                forms = (getattr(reader,"readvector",None), getattr(reader,"readtext",None))
+                try:
+                    self.readerPtr, msg = call(reader,f,msg)
+                except Exception:
+                    if(not f.exhausted):
+                        raise
+                if(f.exhausted):
+                    if(stor is not None and n == 0):
+                        stor.clear() # also forget the width set by the cut off record
+                    elif(stor is not None):
+                        stor.truncate(n)
+                    if(hasattr(reader,"_pending")):
+                        del reader._pending[npending:]
+                    if(forms[0] is not None):
+                        reader.readvector, reader.readtext = forms # the form may have been decided from the cut off record
+                    self.restore({"offset":recordStart, "reader":None, "msg":None})
+                    break
+                count += 1
+            else:
+                self.restore({"offset":f.tell(), "reader":None, "msg":None})
+        self.flush()
+        return count
+
+    def follow(self,path,interval = 1.0):
+        """
+        a generator that keeps parsing the growing log, yields the number of new records after each poll
+        usage:
+            for n in parser.follow("ctrl.log"):
+                if(n): replot()
+        """
+        while(True):
+            yield self.parse_incremental(path)
+            time.sleep(interval)
+
 
 class SequenceParser(Parser):
     """
         A parser drived by reading in sequence
     """
-    def __init__(self,trigger = None, readers = None):
-        super().__init__()
+    def __init__(self,trigger = None, readers = None, profile = False):
+        super().__init__(profile)
         self.readers = readers if (readers is not None) else [] # Note! this readers.copy is very important, otherwise even not passing this parameter, the reader still not get correctly initiallized
         if(trigger is not None):
             self.passinit = readPassInit(triggers=[trigger],readers=[None])
         else:
-            self.passinit = lambda a,b: None,None # do not wait for a trigger
+            self.passinit = lambda a,b: (None,b) # do not wait for a trigger
         # hack the self.readerPrt so that the reader starts from the first item of readers
         # self.readerPtr = lambda f,msg: self.readers[0],None 
 
@@ -332,15 +1608,140 @@ class SequenceParser(Parser):
     
 
     def __call__(self, f, msg = None):
+        if(isinstance(f,str)):
+            with LineSource(f) as src:
+                return self(src,msg)
+        if(self.profile):
+            f = _countingSource(f)
+            call = self._callReader
+        else:
+            call = lambda r,f,msg: r(f,msg)
         _, msg = self.passinit(f,msg)
         while(True):
             msg = f.readline() if(msg is None) else msg
             if(self.readers[0].trigger in msg):
                 for r in self.readers:
-                    _, msg =  r(f,msg)    
+                    _, msg =  call(r,f,msg)
             else:
+                self.flush()
                 return msg
-    
+
+    def flush(self):
+        for r in self.readers:
+            if(hasattr(r,"flush")):
+                r.flush()
+
+
+class RegexParser(Parser):
+    """
+        A parser that runs one regular expression over big blocks of the file instead of line by line,
+        and converts the groups of all the matches of a block into a structured array at once
+            schema: {field name: dtype} of the groups, matched by name if the pattern has named groups, otherwise in order
+        The matches must not span lines
+        basic usage:
+            parser = RegexParser(r"t=(\\d+) force: (\\S+)", {"t": np.int64, "force": float}, "forces")
+            with LineSource("ctrl.log") as f:
+                parser(f)
+            parser.stor.values["force"]
+    """
+    def __init__(self, rgex, schema, name = "", profile = False):
+        super().__init__(profile)
+        self.rgex = rgex
+        self.stor = structuredStor(name, schema)
+        self.pattern = re.compile(rgex.encode() if isinstance(rgex,str) else rgex)
+        names = list(schema.keys())
+        groupindex = self.pattern.groupindex
+        if(all(n in groupindex for n in names)):
+            self.columns = [groupindex[n]-1 for n in names]
+        else:
+            self.columns = list(range(len(names)))
+        if(self.pattern.groups < len(names)):
+            raise ValueError("the pattern has {} groups for {} fields".format(self.pattern.groups, len(names)))
+
+    def convert(self, matches):
+        """
+        the list of matches from `findall` as a structured array
+        """
+        raw = np.array(matches, dtype = bytes).reshape(len(matches), -1)
+        out = np.empty(len(matches), dtype = self.stor.dtype)
+        for name,col in zip(self.stor.dtype.names, self.columns):
+            out[name] = raw[:,col].astype(self.stor.dtype[name])
+        return out
+
+    def __call__(self, f, msg = None):
+        """
+        f: a `LineSource`, a path or an opened file. `msg` is ignored, the parsing starts at the current position of `f`
+        """
+        own = not isinstance(f,LineSource)
+        src = LineSource(f) if own else f
+        t = time.perf_counter()
+        start = src.tell()
+        findall = self.pattern.findall
+        while(True):
+            chunk = src.readchunk()
+            if(chunk == b""):
+                break
+            matches = findall(chunk)
+            if(len(matches)):
+                self.stor.appendBlock(self.convert(matches))
+        if(self.profile):
+            st = self._stats.setdefault(self._label(self), {"calls":0, "lines":0, "bytes":0, "records":0, "seconds":0.})
+            st["calls"] += 1
+            st["bytes"] += src.tell() - start
+            st["records"] = len(self.stor)
+            st["seconds"] += time.perf_counter() - t
+        if(own):
+            src.close()
+        return None
+
+
+def _shardBoundaries(path, matcher, workers):
+    """
+    split the file into at most `workers` byte ranges, each (except the first) starting at a line with a trigger
+    """
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path,"rb") as f:
+        for k in range(1,workers):
+            src = LineSource(f, start = size*k//workers)
+            if(k*size//workers > 0):
+                src.readline() # the boundary usually falls in the middle of a line
+            if(src.skipUntil(matcher) == ""):
+                break
+            if(src.lineOffset > starts[-1]):
+                starts.append(src.lineOffset)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _parseShard(path, parser_factory, start, end):
+    parser = parser_factory()
+    with LineSource(path, start = start, end = end) as f:
+        parser(f)
+    return parser.stors()
+
+
+def parse_parallel(path, parser_factory, workers = None):
+    """
+    parse one big log with several processes
+        parser_factory: a picklable callable (e.g. a module level function) that returns a fresh `TriggerParser`
+    The file is cut at lines where one of the triggers begins, each shard is parsed by its own parser in a process pool,
+        and the stors are merged back in file order into the parser that is returned.
+    Note: this assumes that the trigger strings do not appear inside the body of a record
+    A compressed log can not be split, it is parsed in this process
+    """
+    workers = workers if (workers is not None) else os.cpu_count()
+    parser = parser_factory()
+    if(isCompressed(path)):
+        parser(path)
+        return parser
+    shards = _shardBoundaries(path, parser.passreader.matcher(), workers)
+    with ProcessPoolExecutor(max_workers = workers) as ex:
+        results = [ex.submit(_parseShard, path, parser_factory, start, end) for start,end in shards]
+        for res in results:
+            for stor,part in zip(parser.stors(), res.result()):
+                if(stor is not None):
+                    stor.extend(part)
+    return parser
 
 
 """
@@ -401,8 +1802,8 @@ class readLSE(LogParser.readVector):
         vec = self.readvector(f,msg[len(self.trigger):])
         self.classifyParser(f)
         self.stor((vec,self.classifiedPointStor.stor.copy(), self.classifiedBoundStor.stor.copy()))
-        self.classifiedPointStor.stor.clear() 
-        self.classifiedBoundStor.stor.clear()
+        self.classifiedPointStor.clear() # `stor` is an array view of the rows, clear the stor itself
+        self.classifiedBoundStor.clear()
         return self.passreader, None
 
 
@@ -1,2 +1,4 @@
 # from LogParser import *
-from .LogParser import *
\ No newline at end of file
+from .LogParser import *
+from .parseCache import *
+from .dataset import *
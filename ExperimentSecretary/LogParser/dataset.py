@@ -0,0 +1,151 @@
+"""
+    Load the logs of several runs of the same experiment and align their timed stors on a common time grid
+"""
+import numpy as np
+import os
+import glob
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .LogParser import isCompressed, simpleTimedVecterStor
+
+
+def findRuns(source):
+    """
+    the {run name: path} of the logs in `source`, sorted by path
+        source: a directory, a glob pattern or a list of paths. The run name is the file name without its extensions
+    """
+    if(isinstance(source,str)):
+        if(os.path.isdir(source)):
+            paths = [os.path.join(source,n) for n in os.listdir(source)]
+            paths = [p for p in paths if os.path.isfile(p)]
+        else:
+            paths = glob.glob(source)
+    else:
+        paths = list(source)
+    runs = OrderedDict()
+    for p in sorted(paths):
+        name = os.path.basename(p)
+        if(isCompressed(name)):
+            name = os.path.splitext(name)[0]
+        name = os.path.splitext(name)[0]
+        if(name in runs):
+            raise ValueError("two logs for the run '{}': {} and {}".format(name, runs[name], p))
+        runs[name] = p
+    return runs
+
+
+def _storsOf(parser):
+    if(hasattr(parser,"stors")):
+        return parser.stors()
+    return [getattr(r,"stor",None) for r in parser.readers] # SequenceParser
+
+
+def _parseRun(path, parser_factory):
+    parser = parser_factory()
+    parser(path)
+    return _storsOf(parser)
+
+
+def resampleTimed(stor, grid, zerotime = None, dims = None):
+    """
+    the values of a timed stor linearly interpolated at `grid` (seconds after `zerotime`), shape (len(grid), dims)
+        Like `np.interp`, the values are held constant outside of the recorded time range
+    """
+    t = stor.convertedTime(zerotime)
+    v = stor.values if (dims is None) else stor.values[:,dims]
+    if(len(t) == 0):
+        return np.full((len(grid), v.shape[1]), np.nan)
+    if(len(t) == 1):
+        return np.repeat(v, len(grid), axis = 0).astype(float)
+    grid = np.clip(grid, t[0], t[-1])
+    i = np.clip(np.searchsorted(t, grid, side = "right"), 1, len(t)-1)
+    t0, t1 = t[i-1], t[i]
+    dt = t1 - t0
+    w = np.divide(grid - t0, dt, out = np.zeros_like(grid, dtype = float), where = dt != 0)[:,None]
+    return v[i-1]*(1-w) + v[i]*w
+
+
+class runDataset:
+    """
+    The stors of several runs, parsed concurrently by a process pool
+        source: a directory, a glob pattern or a list of log paths, see `findRuns`
+        parser_factory: a picklable callable (e.g. a module level function) that returns a fresh `TriggerParser` or `SequenceParser`
+        workers: the number of processes, 1 parses in this process
+    basic usage:
+        data = runDataset("logs/walk_*.log.gz", makeParser)
+        grid, forces = data.stack("force", dt = 0.01)   # forces.shape == (runs, time, dims)
+        plt.plot(grid, forces.mean(axis = 0))
+    """
+    def __init__(self, source, parser_factory, workers = None):
+        self.paths = findRuns(source)
+        self.parser_factory = parser_factory
+        self.parsers = OrderedDict()
+        if(workers == 1):
+            for run,path in self.paths.items():
+                self.parsers[run] = parser_factory()
+                self.parsers[run](path)
+            return
+        with ProcessPoolExecutor(max_workers = workers) as ex:
+            results = [(run, ex.submit(_parseRun, path, parser_factory)) for run,path in self.paths.items()]
+            for run,res in results:
+                parser = parser_factory()
+                for stor,part in zip(_storsOf(parser), res.result()):
+                    if(stor is not None):
+                        stor.extend(part)
+                self.parsers[run] = parser
+
+    @property
+    def runs(self):
+        return list(self.parsers.keys())
+
+    def __len__(self):
+        return len(self.parsers)
+
+    def stor(self, key, run):
+        """
+        the stor of one run, key: the name of the stor or its index in the parser
+        """
+        stors = _storsOf(self.parsers[run])
+        if(isinstance(key,int)):
+            return stors[key]
+        for s in stors:
+            if(getattr(s,"name",None) == key):
+                return s
+        raise KeyError("no stor named '{}' in run '{}'".format(key, run))
+
+    def stors(self, key):
+        """
+        {run: stor} of the stor `key` in every run
+        """
+        return OrderedDict((run, self.stor(key,run)) for run in self.parsers)
+
+    def timeGrid(self, key, dt = None, n = None):
+        """
+        a common time grid (seconds after the first time stamp of each run) over the time range covered by all runs
+            either the step `dt` or the number of points `n` (default 1000)
+        """
+        ends = []
+        for run,s in self.stors(key).items():
+            if(not isinstance(s,simpleTimedVecterStor)):
+                raise TypeError("the stor '{}' of run '{}' has no time stamps".format(key, run))
+            t = s.convertedTime()
+            ends.append(t[-1] if len(t) else 0.)
+        end = min(ends) if len(ends) else 0.
+        if(dt is not None):
+            return np.arange(0., end + dt/2, dt)
+        return np.linspace(0., end, n if (n is not None) else 1000)
+
+    def stack(self, key, grid = None, dt = None, n = None, dims = None, zerotimes = None):
+        """
+        resample the timed stor `key` of every run on a common grid
+            grid: the time grid in seconds, built by `timeGrid(key, dt, n)` if None
+            zerotimes: {run: the time stamp of time 0}, default the first time stamp of each run
+        return grid, array of shape (runs, time, dims) in the order of `runs`
+        """
+        stors = self.stors(key)
+        if(grid is None):
+            grid = self.timeGrid(key, dt, n)
+        zerotimes = zerotimes if (zerotimes is not None) else {}
+        out = [resampleTimed(s, grid, zerotimes.get(run), dims) for run,s in stors.items()]
+        return grid, np.stack(out) if len(out) else np.empty((0, len(grid), 0))
@@ -0,0 +1,137 @@
+"""
+    Cache the stors of a parsed log on disk, so that parsing the same unchanged log again only loads the arrays
+"""
+import numpy as np
+import os
+import json
+import hashlib
+
+from .LogParser import LineSource, parse_parallel, isCompressed, simpleVecterStor, simpleTimedVecterStor, mappedVecterStor
+
+
+defaultCacheDir = os.path.join(os.path.expanduser("~"), ".cache", "experimentSecretary", "parse")
+
+
+def logFingerprint(path, contentHash = False, blocksize = 1<<22):
+    """
+    a cheap description of the log file: path, size and mtime, optionally the sha1 of the content
+    """
+    st = os.stat(path)
+    fp = {"path": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime_ns}
+    if(contentHash):
+        h = hashlib.sha1()
+        with open(path,"rb") as f:
+            for block in iter(lambda: f.read(blocksize), b""):
+                h.update(block)
+        fp["sha1"] = h.hexdigest()
+    return fp
+
+
+def parserSignature(parser):
+    """
+    the configuration of a TriggerParser: triggers, reader types, stor types, names and dimnames
+    """
+    sig = []
+    for t,r in zip(parser.passreader.triggers, parser.passreader.readers):
+        stor = getattr(r,"stor",None)
+        sig.append([t, type(r).__name__, type(stor).__name__,
+            getattr(stor,"name",None), list(getattr(stor,"dimNames",[]))])
+    return sig
+
+
+def _cacheKey(path, parser, contentHash):
+    desc = json.dumps([logFingerprint(path,contentHash), parserSignature(parser)], sort_keys = True)
+    return hashlib.sha1(desc.encode()).hexdigest()
+
+
+def _saveStors(filename, stors, checkpoint = None):
+    arrays = {}
+    if(checkpoint is not None):
+        arrays["checkpoint"] = np.array(json.dumps(checkpoint))
+    for i,stor in enumerate(stors):
+        if(stor is None):
+            continue
+        if(isinstance(stor,simpleVecterStor)):
+            arrays["{}_values".format(i)] = stor.values
+            if(isinstance(stor,simpleTimedVecterStor)):
+                arrays["{}_timestamps".format(i)] = stor.timestamps
+        else:
+            items = np.empty(len(stor.stor),dtype = object)
+            for j,item in enumerate(stor.stor): # item-wise, so that nested lists are not turned into an array
+                items[j] = item
+            arrays["{}_items".format(i)] = items
+    tmpname = filename + ".tmp"
+    with open(tmpname,"wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmpname, filename)
+
+
+def _loadStors(filename, stors):
+    """
+    load the stors, return the saved checkpoint of the parser (None if there is none)
+    """
+    with np.load(filename, allow_pickle = True) as data:
+        checkpoint = json.loads(str(data["checkpoint"])) if ("checkpoint" in data.files) else None
+        for i,stor in enumerate(stors):
+            if(stor is None):
+                continue
+            stor.clear()
+            if(isinstance(stor,simpleVecterStor)):
+                values = data["{}_values".format(i)]
+                if(not len(values)):
+                    continue
+                if(isinstance(stor,mappedVecterStor)): # keep it on disk
+                    stor.appendBlock(values, data["{}_timestamps".format(i)] if isinstance(stor,simpleTimedVecterStor) else None)
+                    continue
+                stor._buf = values
+                stor._len = len(values)
+                if(isinstance(stor,simpleTimedVecterStor)):
+                    stor._times = data["{}_timestamps".format(i)]
+            else:
+                stor.stor = list(data["{}_items".format(i)])
+    return checkpoint
+
+
+def evictCache(cacheDir = defaultCacheDir, maxBytes = 1<<31):
+    """
+    remove the least recently used cache files until the cache is smaller than `maxBytes`
+    """
+    files = [os.path.join(cacheDir,n) for n in os.listdir(cacheDir) if n.endswith(".npz")]
+    files = sorted((os.stat(n).st_mtime, os.path.getsize(n), n) for n in files)
+    total = sum(s for _,s,_ in files)
+    for _,size,n in files:
+        if(total <= maxBytes):
+            break
+        os.remove(n)
+        total -= size
+
+
+def parse_cached(path, parser_factory, cacheDir = defaultCacheDir, contentHash = False, maxBytes = 1<<31, workers = None):
+    """
+    parse the log with the TriggerParser returned by `parser_factory`, or load its stors from the cache if the same log
+        was parsed by a parser with the same configuration before.
+    The cache files are `.npz` in `cacheDir`, a hit refreshes the mtime, and the least recently used files are removed beyond `maxBytes`
+        workers: if not None, use `parse_parallel` with this number of processes on a miss
+    The parser returned (on a hit too) has the checkpoint of the parsed log, so `parse_incremental` and `follow` continue after it.
+        A parallel parse reads the whole file, its checkpoint is the end of the file
+    """
+    parser = parser_factory()
+    os.makedirs(cacheDir, exist_ok = True)
+    filename = os.path.join(cacheDir, _cacheKey(path, parser, contentHash) + ".npz")
+    if(os.path.exists(filename)):
+        checkpoint = _loadStors(filename, parser.stors())
+        if(checkpoint is not None):
+            parser.restore(checkpoint)
+        os.utime(filename)
+        return parser
+
+    if(isCompressed(path)): # can not be continued
+        parser(path)
+    elif(workers is not None):
+        parser = parse_parallel(path, parser_factory, workers)
+        parser.restore({"offset": os.path.getsize(path), "reader": None, "msg": None})
+    else:
+        parser.parse_incremental(path) # stops before a record cut off at the end, which is read by the next call
+    _saveStors(filename, parser.stors(), None if isCompressed(path) else parser.checkpoint())
+    evictCache(cacheDir, maxBytes)
+    return parser
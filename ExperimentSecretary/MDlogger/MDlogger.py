@@ -1,6 +1,97 @@
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import collections
 import time 
 import os
+import io
+
+from .. import _lazy # matplotlib and numpy are imported by the functions that use them, not with the package
+
+
+class _rgbaBuffer(io.BytesIO):
+    """
+        the target of `savefig(format = "rgba")`, keeps the written pixels as an array of shape (height, width, 4)
+    """
+    rgba = None
+
+    def write(self, data):
+        import numpy as np
+        self.rgba = np.array(data, dtype = np.uint8)
+        return self.rgba.nbytes
+
+
+class figRenderer:
+    """
+        Save figures without waiting for the PNG encoding
+        `save` renders the figure with `savefig` into an RGBA buffer right away (so the figure can be cleared afterwards,
+        and the savefig.* rcParams apply as for `plt.savefig`), the encoding and writing is done in a thread pool. The writes to the same path are done in order.
+        Vector formats (.pdf, .svg, ...) are written by `savefig` right away.
+    """
+    rasterFormats = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".webp")
+
+    def __init__(self, workers = 2, maxPending = 16):
+        self.pool = ThreadPoolExecutor(max_workers = workers)
+        self.maxPending = maxPending
+        self.pending = collections.deque()
+        self.written = {} # image hash -> a file (saved with `dedupe`) that holds the image
+        self.contents = {} # file -> the hash of the image last written to it
+        self.writing = {} # file -> the future of its last write
+
+    def _forget(self, path):
+        """
+            the file is about to be rewritten, it can no longer stand for its old image
+        """
+        old = self.contents.pop(path, None)
+        if(old is not None and self.written.get(old) == path):
+            del self.written[old]
+        last = self.writing.pop(path, None)
+        if(last is not None):
+            last.result()
+
+    def save(self, path, fig = None, dedupe = False):
+        """
+            dedupe: if the same image was saved with `dedupe` before, return the path of that file instead of writing `path`
+                (for generated file names only, a name given by the user is always written)
+            return the path of the image
+        """
+        plt = _lazy.importPyplot()
+        fig = plt.gcf() if (fig is None) else fig
+        if(os.path.splitext(path)[1].lower() not in self.rasterFormats):
+            self._forget(path)
+            fig.savefig(path)
+            return path
+        buf = _rgbaBuffer()
+        fig.savefig(buf, format = "rgba") # draws on a temporary Agg canvas, fig.canvas is left as it is
+        rgba = buf.rgba
+        if(rgba is None or rgba.ndim != 3): # the pixels were not written in one piece, no shape to encode them with
+            self._forget(path)
+            fig.savefig(path)
+            return path
+        dpi = plt.rcParams["savefig.dpi"]
+        dpi = fig.dpi if (dpi == "figure") else dpi
+        key = hashlib.sha1(rgba.tobytes()).hexdigest() + str(rgba.shape)
+        if(dedupe and key in self.written):
+            return self.written[key]
+        self._forget(path)
+        self.contents[path] = key
+        if(dedupe):
+            self.written[key] = path
+        while(len(self.pending) >= self.maxPending):
+            self.pending.popleft().result()
+        self.writing[path] = self.pool.submit(plt.imsave, path, rgba, dpi = dpi)
+        self.pending.append(self.writing[path])
+        return path
+
+    def wait(self):
+        """
+            wait for all the pending images to be written
+        """
+        while(len(self.pending)):
+            self.pending.popleft().result()
+        self.writing = {}
+
+# the renderer used by `figOutputer` and `Doc`
+renderer = figRenderer()
 
 
 def figOutputer(func,**outKwarg):
@@ -8,16 +99,17 @@ def figOutputer(func,**outKwarg):
         A function decorator for functions that calls matplotlib to output a figure. 
     """
     def wrap_func(*args, savepath = None,doc = None,show = True, **kwargs):
+        plt = _lazy.importPyplot()
         res = func(*args,**kwargs)
         if(savepath is not None):
             if ("." not in savepath): # the save path is not a file name, it is a path name
                 os.makedirs(savepath, exist_ok=True)
                 try:
-                    plt.savefig(os.path.join(savepath,"{}.png".format(kwargs["title"])))
+                    renderer.save(os.path.join(savepath,"{}.png".format(kwargs["title"])))
                 except:
-                    plt.savefig(os.path.join(savepath,"{}.png".format(int(time.time()*10))))
+                    renderer.save(os.path.join(savepath,"{}.png".format(int(time.time()*10))))
             else:
-                plt.savefig(savepath)
+                renderer.save(savepath)
         if(doc is not None):
             if(savepath is None):
                 doc.addplt()
@@ -56,36 +148,116 @@ class Doc:
         plt.plot(......)
         doc.addplt("figure name") # save the figure into img folder
         doc.generate() # generate corresponding Markdown paragraph
+    The figures are written in the background by `renderer`, `generate` waits for them
+
+    stream: append every item to the markdown file as soon as it is added, instead of keeping it until `generate`
+        syncEvery: fsync the file after this many items
+        pageSize: if not None, start a new page `<name>_0001.md, ...` after this many items, 
+            and `filename` becomes the index page linking to the pages
+        `close` (or leaving a `with Doc(...)` block, which also calls `generate`) closes the files,
+        and a streamed Doc can not be cleared since its items are already written
     """
-    def __init__(self, logDir = "../experiment_results", filename="log_"+time.strftime("%m%d%h")+".md"):
+    def __init__(self, logDir = "../experiment_results", filename="log_"+time.strftime("%m%d%h")+".md",
+            stream = False, syncEvery = 10, pageSize = None):
         self.filename = filename
         os.makedirs(logDir, exist_ok=True)
         self.logdir = logDir
         self.items = []
+        self.renderer = renderer
+        self.stream = stream
+        self.syncEvery = syncEvery
+        self.pageSize = pageSize
+        self._out = None
+        self._index = None
+        self._unsynced = 0
+        self._pageItems = 0
+        self._npages = 0
+        if(self.stream):
+            self._out = open(os.path.join(self.logdir,self.filename),"w")
+            if(self.pageSize is not None):
+                self._index = self._out
+                self._newPage()
+
+    def _newPage(self):
+        if(self._out is not self._index):
+            self._out.close()
+        self._npages += 1
+        page = "{}_{:04d}.md".format(os.path.splitext(self.filename)[0], self._npages)
+        self._index.write("- [page {}]({})\n".format(self._npages, page))
+        self._index.flush()
+        self._out = open(os.path.join(self.logdir,page),"w")
+        self._pageItems = 0
+
+    def _add(self,item):
+        if(not self.stream):
+            self.items.append(item)
+            return
+        if(self._out is None):
+            raise ValueError("the Doc {} is closed".format(self.filename))
+        if(self.pageSize is not None and self._pageItems >= self.pageSize):
+            self._newPage()
+        self._out.write(item.write())
+        self._pageItems += 1
+        self._unsynced += 1
+        if(self._unsynced >= self.syncEvery):
+            self._sync()
+
+    def _sync(self):
+        for f in (self._out, self._index):
+            if(f is not None):
+                f.flush()
+                os.fsync(f.fileno())
+        self._unsynced = 0
     
     def clear(self):
+        if(self.stream):
+            raise ValueError("a streamed Doc can not be cleared, its items are already in the file")
         self.items = []
+
+    def close(self):
+        """
+        wait for the figures, and in stream mode write out and close the page and the index files
+        """
+        self.renderer.wait()
+        if(self._out is None):
+            return
+        self._sync()
+        if(self._index is not None and self._index is not self._out):
+            self._index.close()
+        self._out.close()
+        self._out = self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ex):
+        self.generate()
+        self.close()
     
     def addplt(self,name=""):
-        if('.' in name):
+        generated = ('.' not in name)
+        if(not generated):
             savename = name
         else:
             savename = os.path.join("imgs",name+str(int(time.time()*1000)) + ".png")
-        print("\n![{}]({})\n".format(name,savename))
 
         os.makedirs(os.path.dirname(os.path.join(self.logdir,savename)),exist_ok=True)
-        plt.savefig(os.path.join(self.logdir, savename))
-        self.items.append(Docfig(savename,name))
+        saved = self.renderer.save(os.path.join(self.logdir, savename), dedupe = generated)
+        savename = os.path.relpath(saved, self.logdir) # an identical image saved under a generated name before is linked instead
+        print("\n![{}]({})\n".format(name,savename))
+        self._add(Docfig(savename,name))
     
     def addparagraph(self,content):
         print(content)
-        self.items.append(Docparagraph(content))
+        self._add(Docparagraph(content))
 
     def generate(self):
+        self.renderer.wait()
         savename = os.path.join(self.logdir,self.filename)
         print(savename)
+        if(self.stream): # the items are already in the file
+            self._sync()
+            return
         with open(savename,"w") as f:
             for i in self.items:
                 f.write(i.write())
-
-        
\ No newline at end of file
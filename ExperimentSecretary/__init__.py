@@ -1,2 +1,26 @@
-from ExperimentSecretary.MDlogger import MDlogger
-from ExperimentSecretary.LogParser import LogParser
\ No newline at end of file
+import sys as _sys
+import types as _types
+
+__all__ = ["LogParser", "MDlogger"]
+
+# `ExperimentSecretary.MDlogger` and `ExperimentSecretary.LogParser` are the modules of the same names in the subpackages,
+# imported at the first access so that `import ExperimentSecretary.Core` does not load matplotlib
+_lazySubmodules = {"MDlogger": ".MDlogger.MDlogger", "LogParser": ".LogParser.LogParser"}
+
+def __getattr__(name):
+    import importlib
+    if(name not in _lazySubmodules):
+        raise AttributeError("module {} has no attribute {}".format(__name__, name))
+    module = importlib.import_module(_lazySubmodules[name], __name__)
+    globals()[name] = module
+    return module
+
+
+class _package(_types.ModuleType):
+    def __setattr__(self, name, value):
+        if(name in _lazySubmodules and getattr(value, "__name__", None) == "{}.{}".format(__name__, name)):
+            return # importing a subpackage binds its name to it, keep the name for the module as before
+        super().__setattr__(name, value)
+
+_sys.modules[__name__].__class__ = _package
+del _sys, _types
@@ -0,0 +1,25 @@
+"""
+    Helpers to import matplotlib on its first use, so that importing the package stays fast
+    (numpy, git and bson are imported inside the functions that use them)
+"""
+import importlib
+import os
+import sys
+
+
+def headless():
+    """
+    True on a linux machine without a display, e.g. a cluster node
+    """
+    return (os.name == "posix" and sys.platform != "darwin"
+        and not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"))
+
+
+def importPyplot():
+    """
+    import matplotlib.pyplot, with the Agg backend if there is no display and no backend was chosen
+    """
+    if("matplotlib.pyplot" not in sys.modules and not os.environ.get("MPLBACKEND") and headless()):
+        import matplotlib
+        matplotlib.use("Agg")
+    return importlib.import_module("matplotlib.pyplot")
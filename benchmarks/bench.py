@@ -0,0 +1,241 @@
+"""
+    Benchmarks of ExperimentSecretary on synthetic workloads
+
+    python benchmarks/bench.py --size-mb 50 --triggers 8 --out bench_results.json
+    python benchmarks/bench.py --import-budget 0.3   # only the import cases, exit 1 if over budget (see check_import.py)
+
+    Every case runs in a fresh process, so that the reported peak RSS belongs to that case only.
+    The results (with the versions and the git commit) are written as json, to be compared between runs.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from ExperimentSecretary.LogParser import LogParser
+from ExperimentSecretary.MDlogger import MDlogger
+from check_import import importTime, checkedModules, heavyModules
+
+
+#############################################################################
+##################  SYNTHETIC LOGS ##########################################
+#############################################################################
+
+def _vec(rng, n, brackets = False):
+    s = " ".join("{:.6f}".format(rng.uniform(-10,10)) for _ in range(n))
+    return "[{}]".format(s) if brackets else s
+
+
+def writeLog(path, kind, sizeMB, ntriggers, dim = 6, noise = 0.5, seed = 0):
+    """
+    write a log of about `sizeMB` with records of the format `kind` for `ntriggers` different triggers,
+        `noise` is the fraction of lines that belong to no record
+    return the number of records written
+    """
+    rng = random.Random(seed)
+    target = sizeMB * (1<<20)
+    written = records = 0
+    with open(path,"w") as f:
+        while(written < target):
+            if(rng.random() < noise):
+                block = "noise line {} of the controller, nothing to see\n".format(rng.randrange(1<<30))
+            else:
+                k = rng.randrange(ntriggers)
+                records += 1
+                if(kind == "prettyprint"):
+                    block = "vec{}\n{}\n".format(k, _vec(rng,dim))
+                elif(kind == "oneline"):
+                    block = "ol{}:{}\n".format(k, _vec(rng,dim,True))
+                elif(kind == "timed"):
+                    block = "tvec{} time_stamp: {}\ntvec{} \n{}\n".format(k, written, k, _vec(rng,dim))
+                elif(kind == "sequence"):
+                    block = "initState: {}\n".format(_vec(rng,4,True))
+                    for _ in range(rng.randrange(1,5)):
+                        block += "moved Points: {}\nits Cl and Cu: {:.4f} {:.4f}\n".format(_vec(rng,2), rng.random(), rng.random())
+                    block += "episode end\n"
+            f.write(block)
+            written += len(block)
+    return records
+
+
+class readEpisode(LogParser.FSMreader):
+    """
+    a reader with a nested SequenceParser, like the `readLSE` example in LogParser
+    """
+    def __init__(self, stor, trigger, passreader):
+        self.stor = stor
+        self.trigger = trigger
+        self.passreader = passreader
+        self.inner = LogParser.SequenceParser(trigger = "moved Points:")
+        self.points = self.inner.addVecParser("moved Points:", "points", parsType = LogParser.readOnelineVector)
+        self.bounds = self.inner.addItemParser("its Cl and Cu:", "bounds", rgex = r"its Cl and Cu: (\S+) (\S+)")
+
+    def __call__(self, f, msg = None):
+        msg = self.inner(f, None)
+        self.stor(len(self.points))
+        return self.passreader, msg
+
+
+def makeParser(kind, ntriggers, batch = None):
+    parser = LogParser.TriggerParser(batch = batch)
+    for k in range(ntriggers):
+        if(kind == "prettyprint"):
+            parser.addVecParser("vec{}".format(k), "vec{}".format(k))
+        elif(kind == "oneline"):
+            parser.addVecParser("ol{}:".format(k), "ol{}".format(k), parsType = LogParser.readOnelineVector)
+        elif(kind == "timed"):
+            parser.addTimedVecParser("tvec{} time_stamp:".format(k), "tvec{}".format(k))
+    if(kind == "sequence"):
+        stor = LogParser.simpleStor("episodes")
+        parser.passreader.addTrigger("initState:", readEpisode(stor, "initState:", parser.passreader))
+    return parser
+
+
+#############################################################################
+##################  CASES ###################################################
+#############################################################################
+
+def _peakRSS():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # MB on linux
+
+
+def parseCase(path, kind, ntriggers, source, batch):
+    parser = makeParser(kind, ntriggers, batch)
+    t = time.perf_counter()
+    if(source == "text"):
+        with open(path) as f:
+            parser(f)
+    else:
+        with LogParser.LineSource(path) as f:
+            parser(f)
+    dt = time.perf_counter() - t
+    nrec = sum(len(s) for s in parser.stors() if s is not None)
+    size = os.path.getsize(path) / (1<<20)
+    return {"seconds": dt, "MB/s": size/dt, "records/s": nrec/dt, "records": nrec, "peakRSS_MB": _peakRSS()}
+
+
+def sessionCase(basedir, terminalLog, gitPolicy, repeat):
+    from ExperimentSecretary.Core import Session
+    t = time.perf_counter()
+    for i in range(repeat):
+        with Session("bench", basedir = basedir, terminalLog = terminalLog, gitPolicy = gitPolicy,
+                recordName = "bench-{}-{}-{}".format(terminalLog, gitPolicy, i)) as s:
+            s.add_info("i", i)
+    dt = (time.perf_counter() - t) / repeat
+    return {"seconds_per_session": dt, "peakRSS_MB": _peakRSS()}
+
+
+def addpltCase(logdir, npoints, repeat):
+    doc = MDlogger.Doc(logdir, "bench.md")
+    x = np.linspace(0, 10, npoints)
+    lat = []
+    for i in range(repeat):
+        plt.plot(x, np.sin(x*(i+1)))
+        t = time.perf_counter()
+        doc.addplt("fig{}".format(i))
+        lat.append(time.perf_counter() - t)
+        plt.clf()
+    t = time.perf_counter()
+    doc.generate()
+    return {"addplt_mean_s": float(np.mean(lat)), "addplt_max_s": float(np.max(lat)),
+        "generate_s": time.perf_counter() - t, "peakRSS_MB": _peakRSS()}
+
+
+def importCase(module):
+    """
+    the time to import `module` in a fresh interpreter, and the number of `heavyModules` it loaded
+    """
+    dt, heavy = importTime(module)
+    return {"seconds": dt, "heavy_modules": len(heavy)}, heavy
+
+
+def _isolated(func, *args):
+    with ProcessPoolExecutor(max_workers = 1) as ex:
+        return ex.submit(func, *args).result()
+
+
+def _gitCommit():
+    try:
+        return subprocess.check_output(["git","rev-parse","HEAD"], cwd = os.path.dirname(os.path.abspath(__file__)),
+            stderr = subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size-mb", type = float, default = 20)
+    ap.add_argument("--triggers", type = int, default = 8)
+    ap.add_argument("--kinds", default = "prettyprint,oneline,timed,sequence")
+    ap.add_argument("--noise", type = float, default = 0.5, help = "fraction of the lines that belong to no record")
+    ap.add_argument("--sessions", type = int, default = 20, help = "sessions per Session case")
+    ap.add_argument("--figures", type = int, default = 20, help = "figures in the Doc.addplt case")
+    ap.add_argument("--out", default = "bench_results.json")
+    ap.add_argument("--import-budget", type = float, default = None,
+        help = "only run the import cases, fail if one takes longer (seconds) or loads one of " + ", ".join(heavyModules))
+    args = ap.parse_args()
+
+    results = []
+    def report(name, params, res):
+        results.append({"name": name, "params": params, "results": res})
+        print("{:<40} {}".format(name, ", ".join("{}={:.4g}".format(k,v) for k,v in res.items())))
+
+    failed = []
+    for module in checkedModules:
+        res, heavy = importCase(module)
+        report("import/" + module, {"module": module}, res)
+        if(args.import_budget is not None and (res["seconds"] > args.import_budget or heavy)):
+            failed.append("{}: {:.3f}s, loaded {}".format(module, res["seconds"], heavy))
+    if(args.import_budget is not None):
+        if(failed):
+            sys.exit("import budget of {}s exceeded\n".format(args.import_budget) + "\n".join(failed))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.kinds.split(","):
+            path = os.path.join(tmp, kind + ".log")
+            writeLog(path, kind, args.size_mb, args.triggers, noise = args.noise)
+            for source, batch in [("text",None), ("linesource",None), ("linesource",4096)]:
+                if(kind == "sequence" and batch is not None):
+                    continue
+                params = {"kind": kind, "sizeMB": args.size_mb, "triggers": args.triggers, "noise": args.noise,
+                    "source": source, "batch": batch}
+                report("parse/{}/{}/batch={}".format(kind, source, batch), params,
+                    _isolated(parseCase, path, kind, args.triggers, source, batch))
+
+        # a repo with one commit, for the cases that collect the git state
+        subprocess.run(["git","init","-q",tmp], check = False)
+        subprocess.run(["git","-c","user.name=bench","-c","user.email=bench@localhost","commit","-q","--allow-empty","-m","init"],
+            cwd = tmp, check = False)
+        for terminalLog in [False, True]:
+            for gitPolicy in ["skip", "full"]:
+                params = {"terminalLog": terminalLog, "gitPolicy": gitPolicy, "repeat": args.sessions}
+                report("session/terminalLog={}/git={}".format(terminalLog, gitPolicy), params,
+                    _isolated(sessionCase, tmp, terminalLog, gitPolicy, args.sessions))
+
+        params = {"points": 10000, "repeat": args.figures}
+        report("doc/addplt", params, _isolated(addpltCase, os.path.join(tmp,"doc"), 10000, args.figures))
+
+    out = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": _gitCommit(), "python": platform.python_version(),
+        "numpy": np.__version__, "platform": platform.platform(), "cases": results}
+    with open(args.out, "w") as f:
+        json.dump(out, f, indent = 2)
+    print("written", args.out)
+
+
+if __name__ == "__main__":
+    main()
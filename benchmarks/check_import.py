@@ -0,0 +1,49 @@
+"""
+    Check that importing the package stays fast: every module below is imported in a fresh interpreter,
+    which must take less than the budget and must not load matplotlib, numpy, GitPython or bson
+
+    python benchmarks/check_import.py --budget 0.5
+
+    Exits with 1 if a module is over budget or loads one of the heavy modules. Run by .github/workflows/checks.yml
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+heavyModules = ["matplotlib", "numpy", "git", "bson"]
+checkedModules = ["ExperimentSecretary", "ExperimentSecretary.Core"]
+
+
+def importTime(module, repeat = 3):
+    """
+    the best time of `repeat` imports of `module` in fresh interpreters, and the `heavyModules` it loaded
+    """
+    code = ("import json, sys, time; t = time.perf_counter(); import {0}; dt = time.perf_counter() - t; "
+        "print(json.dumps([dt, [m for m in {1!r} if m in sys.modules]]))").format(module, heavyModules)
+    best, heavy = None, []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, "-c", code], cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        dt, heavy = json.loads(out.decode().strip().splitlines()[-1])
+        best = dt if (best is None) else min(best, dt)
+    return best, heavy
+
+
+def main():
+    ap = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--budget", type = float, default = 0.5, help = "seconds")
+    args = ap.parse_args()
+    failed = []
+    for module in checkedModules:
+        dt, heavy = importTime(module)
+        print("{:<30} {:.3f}s loaded {}".format(module, dt, heavy))
+        if(dt > args.budget or heavy):
+            failed.append(module)
+    if(failed):
+        sys.exit("import budget of {}s exceeded or heavy modules loaded by: {}".format(args.budget, ", ".join(failed)))
+
+
+if __name__ == "__main__":
+    main()
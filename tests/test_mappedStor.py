@@ -0,0 +1,26 @@
+import numpy as np
+
+from ExperimentSecretary.LogParser.LogParser import mappedVecterStor, mappedTimedVecterStor, openStor
+
+
+def test_view_survives_clear(tmp_path):
+    m = mappedVecterStor(str(tmp_path / "v"), "v", bufferRows = 16)
+    m.appendBlock(np.arange(3000.).reshape(1000,3))
+    v = m.values
+    m.clear()
+    assert v[500,1] == 1501. # the old file is still mapped, shrinking it in place would SIGBUS here
+    m.appendBlock(np.ones((10,3)))
+    assert len(m) == 10 and np.array_equal(m.values, np.ones((10,3)))
+
+
+def test_truncate_overwrites(tmp_path):
+    m = mappedTimedVecterStor(str(tmp_path / "t"), "t", bufferRows = 16)
+    m.appendBlock(np.arange(300.).reshape(100,3), np.arange(100))
+    v = m.values
+    m.truncate(50)
+    assert v[99,2] == 299.
+    m(7, [1,2,3])
+    m.close()
+    m = openStor(str(tmp_path / "t"))
+    assert len(m) == 51
+    assert np.array_equal(m.values[-1], [1,2,3]) and m.timestamps[-1] == 7